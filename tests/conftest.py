@@ -14,12 +14,14 @@ def fake_http_server():
 
         def server():
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
+                server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, max(len(response_content), 65536))
                 server_socket.bind((host, 0))
                 server_socket.listen(1)
                 _, assigned_port = server_socket.getsockname()
                 port_queue.put(assigned_port)
                 conn, _ = server_socket.accept()
                 with conn:
+                    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                     conn.recv(1024)  # Read the request (optional)
                     conn.sendall(response_content)
 
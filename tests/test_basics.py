@@ -1,9 +1,161 @@
+import errno
+import base64
+import fcntl
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import zlib
+
 import pytest
+import zstandard
 from h11._util import RemoteProtocolError
 
+from warcforhumans.api import WARCFile, WARCRecord, WARCWriter, _BackgroundWriter, _DirectIOWriter
+from warcforhumans.compression import Compressor, GZIPCompressor, ZSTDCompressor
+
 def test_simple_warc(verify_content_match):
     verify_content_match(b"HTTP/1.1 200 OK\r\n\r\nHello, world!\r\n\r\n")
 
 def test_non_chunked_encoding(verify_content_match):
     verify_content_match(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n\r\nHello\r\n\r\n")
 
+def test_direct_io(tmp_path, fake_http_server):
+    if not hasattr(os, "O_DIRECT"):
+        pytest.skip("O_DIRECT is not available on this platform")
+    writer = WARCWriter(str(tmp_path / "test"), direct_io=True)
+    response = b"HTTP/1.1 200 OK\r\nContent-Length: 13\r\n\r\nHello, world!"
+    writer.get_session().get(fake_http_server(response))
+    file = writer.warc_file.file
+    if not isinstance(file, _DirectIOWriter):
+        writer.close()
+        pytest.skip("the filesystem holding tmp_path rejects O_DIRECT")
+    assert fcntl.fcntl(file._fd, fcntl.F_GETFL) & os.O_DIRECT
+    writer.close()
+    assert response in (tmp_path / "test.warc").read_bytes()
+
+@pytest.mark.parametrize("options, zstd, expected_types", [
+    ({"background_writes": True}, False, [b"warcinfo", b"response", b"request", b"revisit", b"request"]),
+    ({"async_compress": True}, True, [b"warcinfo", b"response", b"request", b"revisit", b"request"]),
+    ({"background_records": True}, False, [b"warcinfo", b"response", b"request", b"revisit", b"request"]),
+    ({"compute_digests": False}, False, [b"warcinfo", b"response", b"request", b"response", b"request"]),
+], ids=["background_writes", "async_compress", "background_records", "without_digests"])
+def test_writer_options(tmp_path, fake_http_server, options, zstd, expected_types):
+    writer = WARCWriter(str(tmp_path / "test"), compressor=ZSTDCompressor() if zstd else None, **options)
+    response = b"HTTP/1.1 200 OK\r\nContent-Length: 2000\r\n\r\n" + b"a" * 2000
+    session = writer.get_session()
+    session.get(fake_http_server(response))
+    session.get(fake_http_server(response))
+    writer.close()
+    path = writer.warc_file.file_path
+    assert writer.warc_file.bytes_written == os.path.getsize(path)
+    with open(path, "rb") as f:
+        if zstd:
+            content = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True).read()
+        else:
+            content = f.read()
+    assert content.startswith(b"WARC/1.1\r\nWARC-Record-ID:")
+    assert response in content
+    assert re.findall(rb"^WARC-Type: (\w+)\r$", content, re.MULTILINE) == expected_types
+    if options.get("compute_digests") is False:
+        assert content.count(b"WARC-Block-Digest: ") == 1 # only the warcinfo record
+        assert b"WARC-Payload-Digest: " not in content
+
+def test_background_writer_error():
+    if not os.path.exists("/dev/full"):
+        pytest.skip("/dev/full is not available on this platform")
+    writer = _BackgroundWriter("/dev/full")
+    writer.write(b"Hello, world!")
+    with pytest.raises(OSError) as e:
+        writer.close()
+    assert e.value.errno == errno.ENOSPC
+    assert writer.closed
+    with pytest.raises(OSError):
+        writer.write(b"Hello again")
+
+def test_large_response_sendfile(tmp_path, fake_http_server, monkeypatch):
+    if not hasattr(os, "sendfile"):
+        pytest.skip("os.sendfile is not available on this platform")
+    sendfile_calls = []
+    sendfile = os.sendfile
+    def counting_sendfile(*args):
+        sendfile_calls.append(args)
+        return sendfile(*args)
+    monkeypatch.setattr(os, "sendfile", counting_sendfile)
+    body = os.urandom(600 * 1024) # larger than what capture keeps in memory, so the body is spooled to disk
+    response = b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(body) + body
+    writer = WARCWriter(str(tmp_path / "test"), sendfile=True)
+    writer.get_session().get(fake_http_server(response))
+    writer.close()
+    assert sendfile_calls
+    content = (tmp_path / "test.warc").read_bytes()
+    start = content.index(b"WARC-Type: response\r\n")
+    header_end = content.index(b"\r\n\r\n", start) + 4
+    length = int(re.search(rb"\r\nContent-Length: (\d+)\r\n", content[start:header_end]).group(1))
+    assert content[header_end:header_end + length] == response
+    assert content[header_end + length:header_end + length + 4] == b"\r\n\r\n"
+
+def test_reopen_appends(tmp_path, fake_http_server):
+    response = b"HTTP/1.1 200 OK\r\nContent-Length: 13\r\n\r\nHello, world!"
+    writer = WARCWriter(str(tmp_path / "test"))
+    writer.get_session().get(fake_http_server(response))
+    writer.close()
+    first = (tmp_path / "test.warc").read_bytes()
+    writer = WARCWriter(str(tmp_path / "test"))
+    writer.get_session().get(fake_http_server(response))
+    assert fcntl.fcntl(writer.warc_file.file.fileno(), fcntl.F_GETFL) & os.O_APPEND
+    writer.close()
+    content = (tmp_path / "test.warc").read_bytes()
+    assert content.startswith(first)
+    assert len(content) > len(first)
+    assert content.count(b"WARC-Type: warcinfo\r\n") == 2
+    assert content.count(b"WARC-Type: response\r\n") == 2
+
+def test_async_compress_close_after_error(tmp_path):
+    release = threading.Event()
+    class FailingCompressor(Compressor):
+        def write_record(self, record, file):
+            release.wait()
+            raise ValueError("compression failed")
+    warc_file = WARCFile(str(tmp_path / "test"), create_warcinfo=False, compressor=FailingCompressor(), async_compress=True)
+    record = WARCRecord("resource", "text/plain", "http://example.com/")
+    record.set_content(b"Hello, world!")
+    warc_file.write_record(record)
+    release.set()
+    with pytest.raises(ValueError):
+        warc_file.close()
+    assert warc_file.file.closed
+
+def test_gzip_members(tmp_path, fake_http_server):
+    writer = WARCWriter(str(tmp_path / "test"), compressor=GZIPCompressor())
+    response = b"HTTP/1.1 200 OK\r\nContent-Length: 2000\r\n\r\n" + os.urandom(1000).hex().encode()
+    writer.get_session().get(fake_http_server(response))
+    writer.close()
+    data = (tmp_path / "test.warc.gz").read_bytes()
+    assert writer.warc_file.bytes_written == len(data)
+    members = []
+    while data:
+        decompressor = zlib.decompressobj(31)
+        members.append(decompressor.decompress(data))
+        assert decompressor.eof
+        data = decompressor.unused_data
+    assert len(members) == 3 # one gzip member per record
+    assert all(member.startswith(b"WARC/1.1\r\n") and member.endswith(b"\r\n\r\n") for member in members)
+    assert response in members[1]
+
+@pytest.mark.parametrize("size", [1000, 600 * 1024], ids=["in_memory", "spilled"])
+def test_deferred_digest(size):
+    content = os.urandom(size)
+    stream = tempfile.SpooledTemporaryFile(max_size=512 * 1024)
+    stream.write(content)
+    record = WARCRecord("resource", "application/octet-stream", "http://example.com/")
+    record.set_content(stream, close=True, defer_digest=True)
+    record.date()
+    assert stream._rolled == (size > 512 * 1024)
+    assert WARCRecord.WARC_BLOCK_DIGEST not in record.headers
+    serialized = b"".join(record.serialize_stream())
+    record.close()
+    assert b"\r\nContent-Length: %d\r\n" % size in serialized
+    assert b"\r\nWARC-Block-Digest: sha1:%s\r\n" % base64.b32encode(hashlib.sha1(content).digest()) in serialized
+    assert serialized.endswith(b"\r\n\r\n" + content + b"\r\n\r\n")
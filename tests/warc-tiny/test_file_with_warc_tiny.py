@@ -1,3 +1,5 @@
+import io
+import subprocess
 import sys
 from pathlib import Path
 
@@ -5,6 +7,20 @@ import pytest
 import importlib.util
 
 
+def _load_warc_tiny():
+    warc_tiny_path = Path(__file__).parent / "warc-tiny.py"
+    spec = importlib.util.spec_from_file_location("warc_tiny", warc_tiny_path)
+    warc_tiny = importlib.util.module_from_spec(spec)
+    sys.modules["warc_tiny"] = warc_tiny
+    spec.loader.exec_module(warc_tiny)
+    return warc_tiny
+
+
+def _event_summary(event):
+    # Copy memoryviews out; they are only valid while the event is being processed
+    return type(event).__name__, {k: bytes(v) if isinstance(v, memoryview) else v for k, v in vars(event).items()}
+
+
 def test_file_with_warc_tiny(tmp_path, warc_writer, fake_http_server):
     session = warc_writer.get_session()
     session.get(fake_http_server(b"HTTP/1.1 200 OK\r\nContent-Length: 13\r\n\r\nHello, world!\r\n\r\n"))
@@ -16,14 +32,95 @@ def test_file_with_warc_tiny(tmp_path, warc_writer, fake_http_server):
     warc_writer.close()
     path = (tmp_path / "test.warc")
 
-    warc_tiny_path = Path(__file__).parent / "warc-tiny.py"
-    spec = importlib.util.spec_from_file_location("warc_tiny", warc_tiny_path)
-    warc_tiny = importlib.util.module_from_spec(spec)
-    sys.modules["warc_tiny"] = warc_tiny
-    spec.loader.exec_module(warc_tiny)
+    warc_tiny = _load_warc_tiny()
 
     processor = warc_tiny.VerifyMode()
     processor.process_event(warc_tiny.NewFile(str(path)))
     for event in warc_tiny.iter_warc(str(path)):
         processor.process_event(event)
-    processor.process_event(warc_tiny.EndOfFile(str(path)))
\ No newline at end of file
+    processor.process_event(warc_tiny.EndOfFile(str(path)))
+
+def test_fastwarc_events_match_python_parser(tmp_path, warc_writer, fake_http_server):
+    pytest.importorskip("fastwarc")
+    session = warc_writer.get_session()
+    session.get(fake_http_server(b"HTTP/1.1 200 OK\r\nContent-Length: 13\r\n\r\nHello, world!"))
+    session.get(fake_http_server(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nHello\r\n8\r\n, world!\r\n0\r\n\r\n"))
+    warc_writer.close()
+    path = str(tmp_path / "test.warc")
+
+    warc_tiny = _load_warc_tiny()
+    fastwarc_events = [_event_summary(event) for event in warc_tiny._iter_warc_fastwarc(path, None)]
+    py_events = [_event_summary(event) for event in warc_tiny._iter_warc_py(path, None)]
+    assert [name for name, _ in py_events].count("BeginOfRecord") == 5
+    assert fastwarc_events == py_events
+
+
+def test_verify_parallel(tmp_path, fake_http_server):
+    from warcforhumans.api import WARCWriter
+
+    paths = []
+    for name in ("first", "second", "third"):
+        writer = WARCWriter(str(tmp_path / name))
+        writer.get_session().get(fake_http_server(b"HTTP/1.1 200 OK\r\nContent-Length: 13\r\n\r\nHello, world!"))
+        writer.close()
+        paths.append(str(tmp_path / (name + ".warc")))
+    warc_tiny_path = str(Path(__file__).parent / "warc-tiny.py")
+
+    result = subprocess.run([sys.executable, warc_tiny_path, "verify", "-j", "2", *paths], capture_output=True)
+    assert result.returncode == 0, result.stderr
+
+    # Change the body without updating the digests, so that only the second file fails verification
+    Path(paths[1]).write_bytes(Path(paths[1]).read_bytes().replace(b"Hello, world!", b"Hello, World!"))
+    result = subprocess.run([sys.executable, warc_tiny_path, "verify", "--jobs", "2", *paths], capture_output=True)
+    assert result.returncode != 0
+    error = result.stderr.strip().splitlines()[-1]
+    assert paths[1].encode() in error
+    assert paths[0].encode() not in error and paths[2].encode() not in error
+
+
+@pytest.mark.parametrize("args", [["-j"], ["-j", "two"], ["--jobs", "0"]])
+def test_verify_jobs_usage_error(tmp_path, args):
+    warc_tiny_path = str(Path(__file__).parent / "warc-tiny.py")
+    result = subprocess.run([sys.executable, warc_tiny_path, "verify", *args, str(tmp_path / "missing.warc")], capture_output=True)
+    assert result.returncode == 2
+    assert result.stderr.startswith(b"Error: ")
+    assert b"Traceback" not in result.stderr
+
+
+def test_file_object_reader(tmp_path, warc_writer, fake_http_server):
+    session = warc_writer.get_session()
+    session.get(fake_http_server(b"HTTP/1.1 200 OK\r\nContent-Length: 13\r\n\r\nHello, world!"))
+    session.get(fake_http_server(b"HTTP/1.1 200 OK\r\nContent-Length: 100000\r\n\r\n" + b"a" * 100000))
+    warc_writer.close()
+    path = tmp_path / "test.warc"
+
+    warc_tiny = _load_warc_tiny()
+    mmap_events = [_event_summary(event) for event in warc_tiny._iter_warc_py(str(path), None)]
+    with open(path, "rb") as f:
+        file_object_events = [_event_summary(event) for event in warc_tiny._iter_warc_py(f, None)]
+    assert file_object_events == mmap_events
+
+    # A stream that ends inside a block is reported as truncated after the records before it
+    content = path.read_bytes()
+    truncated_events = [_event_summary(event) for event in warc_tiny._iter_warc_py(io.BytesIO(content[:-1000]), None)]
+    assert truncated_events[:-1] == mmap_events[:len(truncated_events) - 1]
+    assert truncated_events[-1] == ("WARCParsingIssueEvent", {"issue": warc_tiny.WARCParsingIssue.TRUNCATED_FILE, "message": None})
+
+
+def test_chunked_transfer_encoding(tmp_path, warc_writer, fake_http_server):
+    # Lower and upper case hex sizes take the fast path, the chunk extension the slow one
+    body = b"1a\r\n" + b"a" * 26 + b"\r\nA;name=value\r\n" + b"b" * 10 + b"\r\n1F4\r\n" + b"c" * 500 + b"\r\n0\r\n\r\n"
+    session = warc_writer.get_session()
+    session.get(fake_http_server(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n" + body))
+    warc_writer.close()
+    path = str(tmp_path / "test.warc")
+
+    warc_tiny = _load_warc_tiny()
+    events = list(warc_tiny._iter_warc_py(path, None))
+    assert not any(isinstance(event, warc_tiny.WARCParsingIssueEvent) for event in events)
+    assert [bytes(event.data) for event in events if isinstance(event, warc_tiny.HTTPBodyChunk) and event.data] == [b"a" * 26, b"b" * 10, b"c" * 500]
+    processor = warc_tiny.VerifyMode()
+    processor.process_event(warc_tiny.NewFile(path))
+    for event in warc_tiny.iter_warc(path, processor.eventTypes):
+        processor.process_event(event)
+    processor.process_event(warc_tiny.EndOfFile(path))
@@ -13,17 +13,22 @@
 #  warc-tiny scrape [-u|--urls] FILES  --  extract all links and page requisites from the records; produces lines of filename, record offset, record URI, link type, inline flag, and URL as JSONL
 #    With --urls, only the URL is printed.
 #    wpull's scrapers are used for the extraction.
-#  warc-tiny verify FILES  --  verify the integrity of a WARC by comparing the digests
+#  warc-tiny verify [-j|--jobs N] FILES  --  verify the integrity of a WARC by comparing the digests
+#    With --jobs, up to N files are verified in parallel worker processes.
+# If FastWARC is installed, it is used to split the input into records; HTTP decoding is always done by warc-tiny itself.
+# If python-isal or zlib-ng is installed, it is used instead of zlib for gzip transfer encoding.
 
 import base64
+import concurrent.futures
 import contextlib
 import enum
 import gzip
 import hashlib
 import json
+import mmap
+import os
 import sys
 import tempfile
-import zlib
 
 try:
 	import wpull.body
@@ -40,6 +45,24 @@ try:
 except ImportError:
 	wpull = None
 
+try:
+	import fastwarc.warc
+except ImportError:
+	fastwarc = None
+
+# Drop-in replacements for zlib with faster decompression
+try:
+	from isal import isal_zlib as zlib
+except ImportError:
+	try:
+		from zlib_ng import zlib_ng as zlib
+	except ImportError:
+		import zlib
+
+
+_HTTP_REQUEST_CTYPES = frozenset((b'application/http;msgtype=request', b'application/http; msgtype=request'))
+_HTTP_RESPONSE_CTYPES = frozenset((b'application/http;msgtype=response', b'application/http; msgtype=response'))
+
 
 def GzipDecompressor():
 	return zlib.decompressobj(16 + zlib.MAX_WBITS)
@@ -47,7 +70,7 @@ def GzipDecompressor():
 
 class DummyDecompressor:
 	def decompress(self, data):
-		return data
+		return bytes(data) # data may be a memoryview slice
 
 
 class Event:
@@ -71,11 +94,25 @@ class BeginOfRecord(Event):
 	def __init__(self, warcHeaders, rawData):
 		self._warcHeaders = warcHeaders
 		self._rawData = rawData
+		# The fields that iter_warc and the modes need for every record, looked up and decoded once
+		self.contentLength = int(warcHeaders[b'content-length'])
+		self.contentType = warcHeaders.get(b'content-type')
+		self.warcType = warcHeaders.get(b'warc-type')
+		self.recordID = warcHeaders.get(b'warc-record-id')
+		self.targetURI = warcHeaders.get(b'warc-target-uri')
+		self.blockDigest = warcHeaders.get(b'warc-block-digest')
+		self.payloadDigest = warcHeaders.get(b'warc-payload-digest')
 
 	@property
 	def warcHeaders(self):
+		# dict of lowercased header name -> stripped value; only the first occurrence of a repeated header is kept
 		return self._warcHeaders
 
+	@property
+	def warcHeaderLines(self):
+		# The previous tuple-of-tuples form, including repeated headers and the version line
+		return tuple(tuple(map(bytes.strip, x.split(b':', 1))) for x in self._rawData.split(b'\r\n'))
+
 	@property
 	def rawData(self):
 		return self._rawData
@@ -127,7 +164,20 @@ class HTTPBodyChunk(_DataChunk):
 
 
 class EndOfRecord(Event):
-	pass
+	def __init__(self, block = b'', rawPayload = b''):
+		self._block = block
+		self._rawPayload = rawPayload
+
+	@property
+	def block(self):
+		# The entire WARC block, i.e. the concatenation of all WARCBlockChunk data of the record
+		# This may be a memoryview that is only valid while the event is being processed.
+		return self._block
+
+	@property
+	def rawPayload(self):
+		# The concatenation of all RawHTTPBodyChunk data of the record
+		return self._rawPayload
 
 
 class WARCParsingIssue(enum.Enum):
@@ -146,103 +196,246 @@ class EndOfFile(FileEvent):
 	pass
 
 
+# Byte value -> value of the hex digit, or 16 for anything that isn't a hex digit
+_HEX_VALUES = bytes(int(chr(i), 16) if chr(i) in '0123456789abcdefABCDEF' else 16 for i in range(256))
+
+
 @contextlib.contextmanager
 def open_warc(f):
 	if hasattr(f, 'read'):
 		yield f
 	else:
 		with open(f, 'rb') as fp:
+			if hasattr(os, 'posix_fadvise'):
+				# Pure sequential scan: allow more aggressive read-ahead
+				try:
+					os.posix_fadvise(fp.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+				except OSError:
+					pass
 			yield fp
 
 
-def iter_warc(f):
+def prefetch_warc(f):
+	'''Ask the kernel to start reading a file in the background so that it is (partially) cached by the time it is processed'''
+	if f == '-' or not hasattr(os, 'posix_fadvise'):
+		return
+	try:
+		with open(f, 'rb') as fp:
+			os.posix_fadvise(fp.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+	except OSError:
+		pass
+
+
+def parse_warc_headers(warcHeaderBuf):
+	# Single pass over the header lines (skipping the version line); keys are lowercased for O(1) lookups
+	assert warcHeaderBuf.startswith(b'WARC/1.0\r\n') or warcHeaderBuf.startswith(b'WARC/1.1\r\n')
+	assert b'\r\nContent-Length:' in warcHeaderBuf
+	headers = {}
+	for line in warcHeaderBuf.split(b'\r\n')[1:]:
+		key, _, value = line.partition(b':')
+		headers.setdefault(key.strip().lower(), value.strip())
+	return headers
+
+
+def iter_warc(f, eventTypes = None):
 	# Yields Events
 	# BeginOfRecord's rawData does not include the CRLF CRLF at the end of the headers, and WARCBlockChunk does not contain the CRLF CRLF after the block either.
+	# If eventTypes is given, WARCBlockChunk, HTTPHeaders, RawHTTPBodyChunk, and HTTPBodyChunk events are only produced if their type is in it.
+
+	if fastwarc is not None:
+		yield from _iter_warc_fastwarc(f, eventTypes)
+	else:
+		yield from _iter_warc_py(f, eventTypes)
 
+
+def _iter_warc_fastwarc(f, eventTypes):
+	# Let FastWARC find the record boundaries in C++ and reuse the Python block decoding for the record contents
+	# FastWARC does not expose the raw header block, so BeginOfRecord's rawData is rebuilt from its parsed headers as 'Name: value' lines with stripped values.
+	# This matches the other paths only for WARCs written in that canonical form, and the CRLF CRLF framing is left to FastWARC rather than checked here.
 	with open_warc(f) as fp:
-		buf = b''
+		isEmpty = True
+		for warcRecord in fastwarc.warc.ArchiveIterator(fp, parse_http = False):
+			isEmpty = False
+			warcHeaderBuf = b'\r\n'.join([warcRecord.headers.status_line_bytes] + [k + b': ' + v for k, v in warcRecord.headers.items_bytes()])
+			beginOfRecord = BeginOfRecord(parse_warc_headers(warcHeaderBuf), warcHeaderBuf)
+			warcContentLength = beginOfRecord.contentLength
+			yield beginOfRecord
+			warcContent = warcRecord.reader.read()
+			if len(warcContent) < warcContentLength:
+				print('Error: truncated WARC', file = sys.stderr)
+				yield WARCParsingIssueEvent(WARCParsingIssue.TRUNCATED_FILE)
+				break
+			yield from _iter_block(beginOfRecord, warcContent, eventTypes)
+		if isEmpty:
+			print('Error: empty file', file = sys.stderr)
+			yield WARCParsingIssueEvent(WARCParsingIssue.EMPTY_FILE)
+
+
+def _iter_warc_py(f, eventTypes):
+	if not hasattr(f, 'read'):
+		# Scan the page cache directly through a memory map instead of copying the file into a read buffer
+		with open_warc(f) as fp:
+			try:
+				mm = mmap.mmap(fp.fileno(), 0, access = mmap.ACCESS_READ)
+			except (ValueError, OSError): # Empty files and non-regular files (e.g. pipes) cannot be mapped
+				mm = None
+			if mm is not None:
+				with mm:
+					yield from _iter_warc_mmap(mm, eventTypes)
+				return
+
+	with open_warc(f) as fp:
+		buf = bytearray() # Consumed from the front with del, which CPython does without moving the remaining bytes
 		isEmpty = True
 		while True:
-			# Read WARC header
-			while b'\r\n\r\n' not in buf:
+			# Read WARC header; only rescan the tail of the buffer after each read
+			headerEnd = buf.find(b'\r\n\r\n')
+			while headerEnd == -1:
+				searchStart = max(0, len(buf) - 3)
 				try:
 					d = fp.read(16777216)
 				except EOFError:
 					break
 				if not d:
 					break
-				buf += d
+				buf.extend(d)
+				headerEnd = buf.find(b'\r\n\r\n', searchStart)
 			if not buf:
 				if isEmpty:
 					print('Error: empty file', file = sys.stderr)
 					yield WARCParsingIssueEvent(WARCParsingIssue.EMPTY_FILE)
 				break
 			isEmpty = False
-			assert b'\r\n\r\n' in buf
-			warcHeaderBuf, buf = buf.split(b'\r\n\r\n', 1)
-			assert warcHeaderBuf.startswith(b'WARC/1.0\r\n') or warcHeaderBuf.startswith(b'WARC/1.1\r\n')
-			assert b'\r\nContent-Length:' in warcHeaderBuf
-			warcHeaders = tuple(tuple(map(bytes.strip, x.split(b':', 1))) for x in warcHeaderBuf.split(b'\r\n'))
-			warcContentType = next(x[1] for x in warcHeaders if x[0] == b'Content-Type')
-			warcContentLength = int(next(x[1] for x in warcHeaders if x[0] == b'Content-Length'))
-			warcType = next(x[1] for x in warcHeaders if x[0] == b'WARC-Type')
-			yield BeginOfRecord(warcHeaders, warcHeaderBuf)
-			recordID = next(x[1] for x in warcHeaders if x[0] == b'WARC-Record-ID')
+			assert headerEnd != -1
+			warcHeaderBuf = bytes(buf[:headerEnd])
+			del buf[:headerEnd + 4]
+			record = BeginOfRecord(parse_warc_headers(warcHeaderBuf), warcHeaderBuf)
+			warcContentLength = record.contentLength
+			yield record
 
 			# Read WARC block (and skip CRLFCRLF at the end of the record)
 			if len(buf) < warcContentLength + 4:
 				try:
-					buf = buf + fp.read(warcContentLength + 4 - len(buf))
+					buf.extend(fp.read(warcContentLength + 4 - len(buf)))
 				except EOFError:
 					pass
 			if len(buf) < warcContentLength + 4:
 				print('Error: truncated WARC', file = sys.stderr)
 				yield WARCParsingIssueEvent(WARCParsingIssue.TRUNCATED_FILE)
 				break
-			warcContent = buf[:warcContentLength]
-			buf = buf[warcContentLength + 4:]
-
-			# Decode HTTP body if appropriate
-			if warcContentType in (b'application/http;msgtype=request', b'application/http; msgtype=request') and warcType == b'request':
-				httpType = 'request'
-			elif warcContentType in (b'application/http;msgtype=response', b'application/http; msgtype=response') and warcType == b'response':
-				httpType = 'response'
-			else:
-				httpType = None
-			if httpType is not None:
-				if b'\r\n\r\n' in warcContent:
-					httpHeaders, httpBody = warcContent.split(b'\r\n\r\n', 1)
-
-					# Parse headers and extract transfer encoding
-					httpHeaderLines = [tuple(map(bytes.strip, x.split(b':', 1))) for x in httpHeaders.split(b'\r\n')]
-					chunked = False
-					gzipped = False
-					if b'\r\ntransfer-encoding' in httpHeaders.lower():
-						transferEncoding = next(x[1] for x in httpHeaderLines if x[0].lower() == b'transfer-encoding')
-						transferEncodings = set(map(bytes.strip, transferEncoding.split(b',')))
-						chunked = b'chunked' in transferEncodings
-						gzipped = b'gzip' in transferEncodings
-
-					yield WARCBlockChunk(httpHeaders + b'\r\n\r\n', isHttpHeader = True)
-					yield HTTPHeaders(httpHeaderLines)
-					yield WARCBlockChunk(httpBody, isHttpHeader = False)
-					yield RawHTTPBodyChunk(httpBody)
-
-					# Decode body
-					if gzipped:
-						httpDecompressor = GzipDecompressor()
-					else:
-						httpDecompressor = DummyDecompressor()
-					if chunked:
-						pos = 0
-						while True:
-							try:
-								chunkLineEnd = httpBody.index(b'\r\n', pos)
-							except ValueError:
-								message = 'could not find chunk line end in record {}'.format(recordID)
-								print('Error: {}, skipping'.format(message), file = sys.stderr)
-								yield WARCParsingIssueEvent(WARCParsingIssue.MALFORMED_HTTP_RECORD, message)
-								break
+			# The view must be released before the buffer can be resized again
+			warcContent = memoryview(buf)[:warcContentLength]
+			try:
+				yield from _iter_block(record, warcContent, eventTypes)
+			finally:
+				warcContent.release()
+			del buf[:warcContentLength + 4]
+
+
+def _iter_warc_mmap(mm, eventTypes):
+	canAdvise = hasattr(mmap, 'MADV_SEQUENTIAL') and hasattr(mmap, 'MADV_DONTNEED')
+	if canAdvise:
+		mm.madvise(mmap.MADV_SEQUENTIAL)
+	released = 0 # Everything before this offset has been handed back to the kernel
+	pos = 0
+	while pos < len(mm):
+		if canAdvise and pos - released >= 16777216:
+			# Drop the pages of records that were already processed to keep the resident set bounded
+			end = pos - pos % mmap.PAGESIZE
+			mm.madvise(mmap.MADV_DONTNEED, released, end - released)
+			released = end
+		headerEnd = mm.find(b'\r\n\r\n', pos)
+		assert headerEnd != -1
+		warcHeaderBuf = mm[pos:headerEnd]
+		record = BeginOfRecord(parse_warc_headers(warcHeaderBuf), warcHeaderBuf)
+		warcContentLength = record.contentLength
+		yield record
+
+		# Slice out the WARC block (and skip CRLFCRLF at the end of the record)
+		blockStart = headerEnd + 4
+		if len(mm) < blockStart + warcContentLength + 4:
+			print('Error: truncated WARC', file = sys.stderr)
+			yield WARCParsingIssueEvent(WARCParsingIssue.TRUNCATED_FILE)
+			break
+		# The view must be released before the map can be closed
+		warcContent = memoryview(mm)[blockStart:blockStart + warcContentLength]
+		pos = blockStart + warcContentLength + 4
+		try:
+			yield from _iter_block(record, warcContent, eventTypes)
+		finally:
+			warcContent.release()
+
+
+def _iter_block(record, warcContent, eventTypes = None):
+	# Yields the events for a record's block, given its BeginOfRecord event
+	# warcContent may be a memoryview into the read buffer; it is only copied into bytes where a consumer needs bytes methods.
+	wantBlockChunks = eventTypes is None or WARCBlockChunk in eventTypes
+	wantHTTPHeaders = eventTypes is None or HTTPHeaders in eventTypes
+	wantRawHTTPBodyChunks = eventTypes is None or RawHTTPBodyChunk in eventTypes
+	wantHTTPBodyChunks = eventTypes is None or HTTPBodyChunk in eventTypes
+	warcContentType = record.contentType
+	warcType = record.warcType
+	recordID = record.recordID
+	httpBody = b''
+
+	# Decode HTTP body if appropriate
+	if warcContentType in _HTTP_REQUEST_CTYPES and warcType == b'request':
+		httpType = 'request'
+	elif warcContentType in _HTTP_RESPONSE_CTYPES and warcType == b'response':
+		httpType = 'response'
+	else:
+		httpType = None
+	if httpType is not None:
+		warcContent = bytes(warcContent)
+		httpHeaderEnd = warcContent.find(b'\r\n\r\n')
+		if httpHeaderEnd != -1:
+			httpHeaders = warcContent[:httpHeaderEnd]
+			httpBody = warcContent[httpHeaderEnd + 4:]
+
+			# Parse headers and extract transfer encoding
+			httpHeaderLines = [tuple(map(bytes.strip, x.split(b':', 1))) for x in httpHeaders.split(b'\r\n')]
+			chunked = False
+			gzipped = False
+			for x in httpHeaderLines[1:]: # Only lowercase the header names, not the entire header block
+				if x[0].lower() == b'transfer-encoding':
+					transferEncodings = set(map(bytes.strip, x[1].split(b',')))
+					chunked = b'chunked' in transferEncodings
+					gzipped = b'gzip' in transferEncodings
+					break
+
+			if wantBlockChunks:
+				yield WARCBlockChunk(httpHeaders + b'\r\n\r\n', isHttpHeader = True)
+			if wantHTTPHeaders:
+				yield HTTPHeaders(httpHeaderLines)
+			if wantBlockChunks:
+				yield WARCBlockChunk(httpBody, isHttpHeader = False)
+			if wantRawHTTPBodyChunks:
+				yield RawHTTPBodyChunk(httpBody)
+
+			# Decode body; skipped entirely (including its parsing issues) when nothing wants HTTPBodyChunk events
+			if wantHTTPBodyChunks:
+				if gzipped:
+					httpDecompressor = GzipDecompressor()
+				else:
+					httpDecompressor = DummyDecompressor()
+				if chunked:
+					httpBodyView = memoryview(httpBody)
+					pos = 0
+					while True:
+						chunkLineEnd = httpBody.find(b'\r\n', pos)
+						if chunkLineEnd == -1:
+							message = 'could not find chunk line end in record {}'.format(recordID)
+							print('Error: {}, skipping'.format(message), file = sys.stderr)
+							yield WARCParsingIssueEvent(WARCParsingIssue.MALFORMED_HTTP_RECORD, message)
+							break
+						# Fast path: a line consisting only of hex digits, decoded in place without slicing
+						chunkLength = 0
+						p = pos
+						while p < chunkLineEnd and (v := _HEX_VALUES[httpBody[p]]) < 16:
+							chunkLength = (chunkLength << 4) | v
+							p += 1
+						if p != chunkLineEnd or p == pos:
+							# Chunk extensions, whitespace, or garbage
 							chunkLine = httpBody[pos:chunkLineEnd]
 							if b';' in chunkLine:
 								chunkLength = chunkLine[:chunkLine.index(b';')].strip()
@@ -254,21 +447,23 @@ def iter_warc(f):
 								yield WARCParsingIssueEvent(WARCParsingIssue.MALFORMED_HTTP_RECORD, message)
 								break
 							chunkLength = int(chunkLength, base = 16)
-							if chunkLength == 0:
-								break
-							chunk = httpDecompressor.decompress(httpBody[chunkLineEnd + 2 : chunkLineEnd + 2 + chunkLength])
-							yield HTTPBodyChunk(chunk)
-							pos = chunkLineEnd + 2 + chunkLength + 2
-					else:
-						yield HTTPBodyChunk(httpDecompressor.decompress(httpBody))
+						if chunkLength == 0:
+							break
+						chunk = httpDecompressor.decompress(httpBodyView[chunkLineEnd + 2 : chunkLineEnd + 2 + chunkLength])
+						yield HTTPBodyChunk(chunk)
+						pos = chunkLineEnd + 2 + chunkLength + 2
 				else:
-					message = 'malformed HTTP request or response in record {}'.format(recordID)
-					print('Warning: {}, skipping'.format(message), file = sys.stderr)
-					yield WARCParsingIssueEvent(WARCParsingIssue.MALFORMED_HTTP_RECORD, message)
-					yield WARCBlockChunk(warcContent)
-			else:
+					chunk = httpDecompressor.decompress(httpBody)
+					yield HTTPBodyChunk(chunk)
+		else:
+			message = 'malformed HTTP request or response in record {}'.format(recordID)
+			print('Warning: {}, skipping'.format(message), file = sys.stderr)
+			yield WARCParsingIssueEvent(WARCParsingIssue.MALFORMED_HTTP_RECORD, message)
+			if wantBlockChunks:
 				yield WARCBlockChunk(warcContent)
-			yield EndOfRecord()
+	elif wantBlockChunks:
+		yield WARCBlockChunk(bytes(warcContent))
+	yield EndOfRecord(warcContent, httpBody)
 
 
 class ProcessMode:
@@ -277,8 +472,18 @@ class ProcessMode:
 		'''Split args into arguments to be passed into __init__ and filenames'''
 		return (), args
 
+	# Event type -> bound handler method; set up by each mode's __init__ so that dispatch is a single dict lookup
+	_handlers = {}
+
 	def process_event(self, event):
-		raise NotImplementedError
+		handler = self._handlers.get(type(event))
+		if handler is not None:
+			handler(event)
+
+	@property
+	def eventTypes(self):
+		'''The event types this mode handles; iter_warc can skip producing the others'''
+		return frozenset(self._handlers)
 
 
 class Digest:
@@ -307,72 +512,106 @@ class VerificationError(Exception):
 
 
 class VerifyMode(ProcessMode):
-	def __init__(self):
-		self._blockDigester = None
+	@classmethod
+	def split_args(cls, args):
+		if args[0] == '-j' or args[0] == '--jobs':
+			try:
+				jobs = int(args[1])
+			except (IndexError, ValueError):
+				jobs = 0
+			if jobs < 1:
+				print('Error: {} takes a positive number of jobs'.format(args[0]), file = sys.stderr)
+				sys.exit(2)
+			return (jobs,), args[2:]
+		return (1,), args
+
+	def __init__(self, jobs = 1):
+		self.jobs = jobs
 		self._recordedBlockDigest = None
-		self._payloadDigester = None
-		self._brokenPayloadDigester = None
 		self._recordedPayloadDigest = None
+		self._payloadDigester = None
 		self._printedBrokenPayloadWarning = False
 		self._verificationFailed = False
+		self._handlers = {
+			NewFile: self._on_new_file,
+			BeginOfRecord: self._on_begin_of_record,
+			HTTPBodyChunk: self._on_http_body_chunk,
+			WARCParsingIssueEvent: self._on_parsing_issue,
+			EndOfRecord: self._on_end_of_record,
+			EndOfFile: self._on_end_of_file,
+		}
+
+	# Labels as they appear in WARC digest headers -> hashlib algorithm names
+	_digestAlgorithms = {b'sha1': 'sha1', b'sha256': 'sha256', b'sha512': 'sha512', b'blake2b': 'blake2b'}
+	# hashlib algorithm name -> (length of the hex encoding, length of the base-32 encoding); these never coincide
+	_digestLengths = {algorithm: (2 * hashlib.new(algorithm).digest_size, len(base64.b32encode(bytes(hashlib.new(algorithm).digest_size)))) for algorithm in _digestAlgorithms.values()}
 
 	def parse_digest(self, digest):
-		if not digest.startswith(b'sha1:'):
+		'''Returns (algorithm, raw digest, Digest class for formatting it), or None if the digest can't be parsed'''
+		label, _, encoded = digest.partition(b':')
+		algorithm = self._digestAlgorithms.get(label)
+		if algorithm is None:
 			print('Warning: don\'t understand hash format: {!r}'.format(digest), file = sys.stderr)
 			return None
-		if len(digest) == 37 and digest.rstrip(b'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567') == b'sha1:': # 5 for 'sha1:' + 32 for base-32 hash
-			return Base32Digest(base64.b32decode(digest[5:]))
-		if len(digest) == 45 and digest.rstrip(b'0123456789abcdef') == b'sha1:':
-			return HexDigest(bytes.fromhex(digest[5:].decode('ascii')))
+		# The encoding is determined by the length alone; the decoders reject invalid characters
+		hexLength, base32Length = self._digestLengths[algorithm]
+		try:
+			if len(encoded) == base32Length:
+				return algorithm, base64.b32decode(encoded), Base32Digest
+			if len(encoded) == hexLength:
+				return algorithm, bytes.fromhex(encoded.decode('ascii')), HexDigest
+		except ValueError:
+			pass
 		return None
 
-	def process_event(self, event):
-		if type(event) is NewFile:
-			self._printedBrokenPayloadWarning = False
-			self._verificationFailed = False
-		elif type(event) is BeginOfRecord:
-			if any(x[0] == b'WARC-Block-Digest' for x in event.warcHeaders):
-				self._blockDigester = hashlib.sha1()
-				self._recordedBlockDigest = self.parse_digest(next(x[1] for x in event.warcHeaders if x[0] == b'WARC-Block-Digest'))
-			else:
-				self._blockDigester = None
-				self._recordedBlockDigest = None
-			if any(x[0] == b'WARC-Payload-Digest' for x in event.warcHeaders):
-				self._payloadDigester = hashlib.sha1()
-				self._brokenPayloadDigester = hashlib.sha1()
-				self._recordedPayloadDigest = self.parse_digest(next(x[1] for x in event.warcHeaders if x[0] == b'WARC-Payload-Digest'))
-			else:
-				self._payloadDigester = None
-				self._brokenPayloadDigester = None
-				self._recordedPayloadDigest = None
-			self._recordID = next(x[1] for x in event.warcHeaders if x[0] == b'WARC-Record-ID')
-			self._recordType = next(x[1] for x in event.warcHeaders if x[0] == b'WARC-Type')
-		elif type(event) is WARCBlockChunk:
-			if self._blockDigester:
-				self._blockDigester.update(event.data)
-		elif type(event) is HTTPBodyChunk:
-			if self._payloadDigester:
-				self._payloadDigester.update(event.data)
-		elif type(event) is RawHTTPBodyChunk:
-			if self._brokenPayloadDigester:
-				self._brokenPayloadDigester.update(event.data)
-		elif type(event) is WARCParsingIssueEvent:
-			self._verificationFailed = True
-		elif type(event) is EndOfRecord:
-			if self._blockDigester and self._recordedBlockDigest:
-				if not self._recordedBlockDigest.equals(self._blockDigester.digest()):
-					print('Block digest mismatch for record {}: recorded {} v calculated {}'.format(self._recordID, self._recordedBlockDigest.format(), self._recordedBlockDigest.format(self._blockDigester.digest())), file = sys.stderr)
+	def _on_new_file(self, event):
+		self._printedBrokenPayloadWarning = False
+		self._verificationFailed = False
+
+	def _on_begin_of_record(self, event):
+		self._recordedBlockDigest = self.parse_digest(event.blockDigest) if event.blockDigest is not None else None
+		self._recordedPayloadDigest = self.parse_digest(event.payloadDigest) if event.payloadDigest is not None else None
+		self._recordID = event.recordID
+		self._recordType = event.warcType
+		if self._recordedPayloadDigest and self._recordType in (b'request', b'response'): #TODO: Support revisit
+			self._payloadDigester = hashlib.new(self._recordedPayloadDigest[0])
+		else:
+			self._payloadDigester = None
+
+	def _on_http_body_chunk(self, event):
+		# The decoded payload only exists as these chunks, so it is hashed as it arrives instead of being joined up
+		if self._payloadDigester:
+			self._payloadDigester.update(event.data)
+
+	def _on_parsing_issue(self, event):
+		self._verificationFailed = True
+
+	def _on_end_of_record(self, event):
+		# The block and the raw payload are contiguous buffers, so each is hashed in a single call
+		# Digests are compared as raw bytes; Digest objects are only needed to format mismatches.
+		if self._recordedBlockDigest:
+			algorithm, recordedDigest, digestType = self._recordedBlockDigest
+			blockDigest = hashlib.new(algorithm, event.block).digest()
+			if blockDigest != recordedDigest:
+				recorded = digestType(recordedDigest)
+				print('Block digest mismatch for record {}: recorded {} v calculated {}'.format(self._recordID, recorded.format(), recorded.format(blockDigest)), file = sys.stderr)
+				self._verificationFailed = True
+		if self._payloadDigester:
+			algorithm, recordedDigest, digestType = self._recordedPayloadDigest
+			payloadDigest = self._payloadDigester.digest()
+			if payloadDigest != recordedDigest:
+				brokenPayloadDigest = hashlib.new(algorithm, event.rawPayload).digest()
+				if brokenPayloadDigest == recordedDigest:
+					if not self._printedBrokenPayloadWarning:
+						print('Warning: WARC uses incorrect payload digests without stripping the transfer encoding', file = sys.stderr)
+						self._printedBrokenPayloadWarning = True
+				else:
+					recorded = digestType(recordedDigest)
+					print('Payload digest mismatch for record {}: recorded {} vs. calculated {} (calculated broken {})'.format(self._recordID, recorded.format(), recorded.format(payloadDigest), recorded.format(brokenPayloadDigest)), file = sys.stderr)
 					self._verificationFailed = True
-			if self._payloadDigester and self._recordedPayloadDigest and self._recordType in (b'request', b'response'): #TODO: Support revisit
-				if not self._recordedPayloadDigest.equals(self._payloadDigester.digest()):
-					if self._recordedPayloadDigest.equals(self._brokenPayloadDigester.digest()):
-						if not self._printedBrokenPayloadWarning:
-							print('Warning: WARC uses incorrect payload digests without stripping the transfer encoding', file = sys.stderr)
-							self._printedBrokenPayloadWarning = True
-					else:
-						print('Payload digest mismatch for record {}: recorded {} vs. calculated {} (calculated broken {})'.format(self._recordID, self._recordedPayloadDigest.format(), self._recordedPayloadDigest.format(self._payloadDigester.digest()), self._recordedPayloadDigest.format(self._brokenPayloadDigester.digest())), file = sys.stderr)
-						self._verificationFailed = True
-		elif type(event) is EndOfFile and self._verificationFailed:
+
+	def _on_end_of_file(self, event):
+		if self._verificationFailed:
 			raise VerificationError('one or more errors encountered while verifying {}'.format(event.filename))
 
 
@@ -391,6 +630,12 @@ class DumpResponsesMode(ProcessMode):
 			self._recordID = None
 			self._targetURI = None
 			self._buffer = b''
+		self._handlers = {
+			NewFile: self._on_new_file,
+			BeginOfRecord: self._on_begin_of_record,
+			HTTPBodyChunk: self._on_http_body_chunk,
+			EndOfRecord: self._on_end_of_record,
+		}
 
 	def _write(self, data):
 		if not self._withMeta:
@@ -405,28 +650,30 @@ class DumpResponsesMode(ProcessMode):
 			sys.stdout.buffer.write(line)
 			sys.stdout.buffer.write(b'\n')
 
-	def process_event(self, event):
-		if type(event) is NewFile:
-			self._filename = event.filename
-			if ':' in self._filename:
-				self._filename = '<' + self._filename + '>'
-		elif type(event) is BeginOfRecord:
-			warcContentType = next(x[1] for x in event.warcHeaders if x[0] == b'Content-Type')
-			warcType = next(x[1] for x in event.warcHeaders if x[0] == b'WARC-Type')
-			self._isResponse = warcContentType in (b'application/http;msgtype=response', b'application/http; msgtype=response') and warcType == b'response'
-			self._printEOR = False
-			if self._withMeta:
-				# Both of these are URIs, and per RFC 3986, those can only contain ASCII characters.
-				self._recordID = next(x[1] for x in event.warcHeaders if x[0] == b'WARC-Record-ID').decode('ascii')
-				self._targetURI = next((x[1] for x in event.warcHeaders if x[0] == b'WARC-Target-URI'), b'').decode('ascii')
-				self._buffer = b''
-		elif type(event) is HTTPBodyChunk:
-			if self._isResponse:
-				self._printEOR = True
-				self._write(event.data)
-		elif type(event) is EndOfRecord:
-			if self._printEOR:
-				self._write(b'\r\n')
+	def _on_new_file(self, event):
+		self._filename = event.filename
+		if ':' in self._filename:
+			self._filename = '<' + self._filename + '>'
+
+	def _on_begin_of_record(self, event):
+		warcContentType = event.contentType
+		warcType = event.warcType
+		self._isResponse = warcContentType in _HTTP_RESPONSE_CTYPES and warcType == b'response'
+		self._printEOR = False
+		if self._withMeta:
+			# Both of these are URIs, and per RFC 3986, those can only contain ASCII characters.
+			self._recordID = event.recordID.decode('ascii')
+			self._targetURI = (event.targetURI or b'').decode('ascii')
+			self._buffer = b''
+
+	def _on_http_body_chunk(self, event):
+		if self._isResponse:
+			self._printEOR = True
+			self._write(event.data)
+
+	def _on_end_of_record(self, event):
+		if self._printEOR:
+			self._write(b'\r\n')
 
 
 class COLOURS:
@@ -442,11 +689,16 @@ class COLOURS:
 class ColourMode(ProcessMode):
 	def __init__(self):
 		self._hadHttpStatusLine = False
+		self._handlers = {
+			BeginOfRecord: self._on_begin_of_record,
+			WARCBlockChunk: self._on_warc_block_chunk,
+			EndOfRecord: self._on_end_of_record,
+		}
 
 	def _replace_esc(self, data):
 		return data.replace(b'\x1b', COLOURS.INVERTED + b'ESC' + COLOURS.RESET)
 
-	def _print_line(self, line, colour, withLF = True, colourOnlyBeforeColon = False):
+	def _line_parts(self, line, colour, colourOnlyBeforeColon):
 		if colourOnlyBeforeColon:
 			if b':' in line:
 				offset = line.index(b':')
@@ -455,44 +707,48 @@ class ColourMode(ProcessMode):
 		else:
 			offset = len(line)
 		if offset > 0:
-			sys.stdout.buffer.write(colour)
-			sys.stdout.buffer.write(self._replace_esc(line[:offset]))
-			sys.stdout.buffer.write(COLOURS.RESET)
-		sys.stdout.buffer.write(line[offset:])
+			return [colour, self._replace_esc(line[:offset]), COLOURS.RESET, line[offset:]]
+		return [line]
+
+	def _print_line(self, line, colour, withLF = True, colourOnlyBeforeColon = False):
+		parts = self._line_parts(line, colour, colourOnlyBeforeColon)
 		if withLF:
-			sys.stdout.buffer.write(b'\n')
+			parts.append(b'\n')
+		sys.stdout.buffer.write(b''.join(parts))
 
 	def _print_data(self, data, colour, colourOnlyBeforeColon):
-		later = False
+		# Collect all lines and hand them to the buffered writer in one call instead of several tiny writes per line
+		parts = []
 		for line in data.split(b'\r\n'):
-			if later:
-				sys.stdout.buffer.write(b'\n')
-			self._print_line(line, colour, withLF = False, colourOnlyBeforeColon = colourOnlyBeforeColon)
-			later = True
+			if parts:
+				parts.append(b'\n')
+			parts.extend(self._line_parts(line, colour, colourOnlyBeforeColon))
+		sys.stdout.buffer.writelines(parts)
+
+	def _on_begin_of_record(self, event):
+		firstNewline = event.rawData.index(b'\r\n')
+		self._print_line(event.rawData[:firstNewline], COLOURS.LIGHTGREEN)
+		self._print_data(event.rawData[firstNewline + 2:], COLOURS.GREEN, True)
+		sys.stdout.buffer.write(b'\n\n') # separator between header and block
+		self._hadHttpStatusLine = False
 
-	def process_event(self, event):
-		if type(event) is BeginOfRecord:
-			firstNewline = event.rawData.index(b'\r\n')
-			self._print_line(event.rawData[:firstNewline], COLOURS.LIGHTGREEN)
-			self._print_data(event.rawData[firstNewline + 2:], COLOURS.GREEN, True)
-			sys.stdout.buffer.write(b'\n\n') # separator between header and block
-			self._hadHttpStatusLine = False
-		elif type(event) is WARCBlockChunk:
-			if event.isHttpHeader is True:
-				if not self._hadHttpStatusLine:
-					firstNewline = event.data.index(b'\r\n')
-					self._print_line(event.data[:firstNewline], COLOURS.LIGHTPURPLE)
-					offset = firstNewline + 2
-					self._hadHttpStatusLine = True
-				else:
-					offset = 0
-				self._print_data(event.data[offset:], COLOURS.PURPLE, True)
-			elif event.isHttpHeader is False:
-				self._print_data(event.data, COLOURS.RED, False)
-			elif event.isHttpHeader is None:
-				sys.stdout.buffer.write(self._replace_esc(event.data))
-		elif type(event) is EndOfRecord:
-			sys.stdout.buffer.write(b'\n\n')
+	def _on_warc_block_chunk(self, event):
+		if event.isHttpHeader is True:
+			if not self._hadHttpStatusLine:
+				firstNewline = event.data.index(b'\r\n')
+				self._print_line(event.data[:firstNewline], COLOURS.LIGHTPURPLE)
+				offset = firstNewline + 2
+				self._hadHttpStatusLine = True
+			else:
+				offset = 0
+			self._print_data(event.data[offset:], COLOURS.PURPLE, True)
+		elif event.isHttpHeader is False:
+			self._print_data(event.data, COLOURS.RED, False)
+		elif event.isHttpHeader is None:
+			sys.stdout.buffer.write(self._replace_esc(event.data))
+
+	def _on_end_of_record(self, event):
+		sys.stdout.buffer.write(b'\n\n')
 
 
 class ScrapeMode(ProcessMode):
@@ -525,51 +781,90 @@ class ScrapeMode(ProcessMode):
 		if not self._urlsOnly:
 			self._filename = None
 			self._recordID = None
+		self._handlers = {
+			BeginOfRecord: self._on_begin_of_record,
+			HTTPHeaders: self._on_http_headers,
+			HTTPBodyChunk: self._on_http_body_chunk,
+			EndOfRecord: self._on_end_of_record,
+		}
+		if not self._urlsOnly:
+			self._handlers[NewFile] = self._on_new_file
 
-	def process_event(self, event):
-		if type(event) is NewFile and not self._urlsOnly:
-			self._filename = event.filename
-		elif type(event) is BeginOfRecord:
-			warcContentType = next(x[1] for x in event.warcHeaders if x[0] == b'Content-Type')
-			warcType = next(x[1] for x in event.warcHeaders if x[0] == b'WARC-Type')
-			self._isResponse = warcContentType in (b'application/http;msgtype=response', b'application/http; msgtype=response') and warcType == b'response'
-			if self._isResponse:
-				self._body = wpull.body.Body(file = tempfile.SpooledTemporaryFile(max_size = 10485760)) # Up to 10 MiB in memory
-			self._printEOR = False
-			if not self._urlsOnly:
-				# Both of these are URIs, and per RFC 3986, those can only contain ASCII characters.
-				self._recordID = next(x[1] for x in event.warcHeaders if x[0] == b'WARC-Record-ID').decode('ascii')
-			self._recordURI = next((x[1] for x in event.warcHeaders if x[0] == b'WARC-Target-URI'), b'').decode('ascii')
-		elif type(event) is HTTPHeaders and self._isResponse:
-			assert len(event.headers[0]) == 1 and event.headers[0][0].startswith(b'HTTP/'), 'malformed HTTP response'
-			_, statusCode, reason = event.headers[0][0].decode('ascii').split(' ', 2)
-			self._statusCode = int(statusCode)
-			self._statusReason = reason
-		elif type(event) is HTTPBodyChunk and self._isResponse:
-			self._body.write(event.data)
-		elif type(event) is EndOfRecord and self._isResponse:
-			request = wpull_protocol_http_request.Request(self._recordURI)
-			response = wpull_protocol_http_request.Response(self._statusCode, self._statusReason)
-			response.body = self._body
-			response.body.seek(0)
-			for scraper, scrapeResult in self._scraper.scrape_info(request, response).items():
-				if not scrapeResult:
+	def _on_new_file(self, event):
+		self._filename = event.filename
+
+	def _on_begin_of_record(self, event):
+		warcContentType = event.contentType
+		warcType = event.warcType
+		self._isResponse = warcContentType in _HTTP_RESPONSE_CTYPES and warcType == b'response'
+		if self._isResponse:
+			self._body = wpull.body.Body(file = tempfile.SpooledTemporaryFile(max_size = 10485760)) # Up to 10 MiB in memory
+		self._printEOR = False
+		if not self._urlsOnly:
+			# Both of these are URIs, and per RFC 3986, those can only contain ASCII characters.
+			self._recordID = event.recordID.decode('ascii')
+		self._recordURI = (event.targetURI or b'').decode('ascii')
+
+	def _on_http_headers(self, event):
+		if not self._isResponse:
+			return
+		assert len(event.headers[0]) == 1 and event.headers[0][0].startswith(b'HTTP/'), 'malformed HTTP response'
+		_, statusCode, reason = event.headers[0][0].decode('ascii').split(' ', 2)
+		self._statusCode = int(statusCode)
+		self._statusReason = reason
+
+	def _on_http_body_chunk(self, event):
+		if not self._isResponse:
+			return
+		self._body.write(event.data)
+
+	def _on_end_of_record(self, event):
+		if not self._isResponse:
+			return
+		request = wpull_protocol_http_request.Request(self._recordURI)
+		response = wpull_protocol_http_request.Response(self._statusCode, self._statusReason)
+		response.body = self._body
+		response.body.seek(0)
+		for scraper, scrapeResult in self._scraper.scrape_info(request, response).items():
+			if not scrapeResult:
+				continue
+			for linkContext in scrapeResult.link_contexts:
+				if self._urlsOnly:
+					print(linkContext.link)
 					continue
-				for linkContext in scrapeResult.link_contexts:
-					if self._urlsOnly:
-						print(linkContext.link)
-						continue
-					o = {
-						'filename': self._filename,
-						'recordOffset': None,
-						'recordID': self._recordID,
-						'recordURI': self._recordURI,
-						'linkType': linkContext.link_type.value if isinstance(linkContext.link_type, enum.Enum) else linkContext.link_type,
-						'inline': bool(linkContext.inline), # Needs manual casting; https://github.com/ArchiveTeam/wpull/issues/458
-						'linked': bool(linkContext.linked),
-						'url': linkContext.link,
-					}
-					print(json.dumps(o))
+				o = {
+					'filename': self._filename,
+					'recordOffset': None,
+					'recordID': self._recordID,
+					'recordURI': self._recordURI,
+					'linkType': linkContext.link_type.value if isinstance(linkContext.link_type, enum.Enum) else linkContext.link_type,
+					'inline': bool(linkContext.inline), # Needs manual casting; https://github.com/ArchiveTeam/wpull/issues/458
+					'linked': bool(linkContext.linked),
+					'url': linkContext.link,
+				}
+				print(json.dumps(o))
+
+
+def _verify_file(f):
+	'''Verify a single file in a worker process; returns whether verification succeeded'''
+	processor = VerifyMode()
+	processor.process_event(NewFile(f))
+	for event in iter_warc(f, processor.eventTypes):
+		processor.process_event(event)
+	try:
+		processor.process_event(EndOfFile(f))
+	except VerificationError:
+		return False
+	return True
+
+
+def verify_parallel(files, jobs):
+	# Verification is independent per file, so spread the files over processes; output order is not preserved.
+	with concurrent.futures.ProcessPoolExecutor(max_workers = jobs) as executor:
+		results = executor.map(_verify_file, files)
+		failed = [f for f, ok in zip(files, results) if not ok]
+	if failed:
+		raise VerificationError('one or more errors encountered while verifying {}'.format(', '.join(failed)))
 
 
 def main():
@@ -583,15 +878,24 @@ def main():
 
 	processor = processorMap[mode](*processorArgs)
 
-	try:
+	if mode == 'verify' and processor.jobs > 1 and '-' not in files:
 		for f in files:
+			print('Info: processing {}'.format(f), file = sys.stderr)
+		verify_parallel(files, processor.jobs)
+		return
+
+	try:
+		for i, f in enumerate(files):
+			if i + 1 < len(files):
+				# Overlap reading the next file with processing this one
+				prefetch_warc(files[i + 1])
 			if f.endswith('.warc.gz') or f.endswith('.warc.zst'):
 				print(f'Warning: warc-tiny does not support decompressing WARCs like {f}. Please use zcat/zstdcat/zstdwarccat and pipe the decompressed stream into warc-tiny instead.', file = sys.stderr)
 			print('Info: processing {}'.format(f), file = sys.stderr)
 			processor.process_event(NewFile(f))
 			if f == '-':
 				f = sys.stdin.buffer
-			for event in iter_warc(f):
+			for event in iter_warc(f, processor.eventTypes):
 					processor.process_event(event)
 			processor.process_event(EndOfFile(f))
 	except BrokenPipeError:
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
 import base64
+import collections
+import concurrent.futures
 import hashlib
 import io
-import random
+import mmap
+import os
+import queue
 import string
 import sys
 import tempfile
-import uuid
+import threading
+import time
 from datetime import datetime, timezone
 from importlib.metadata import version
 from io import BufferedRandom
@@ -20,6 +25,72 @@ from _hashlib import HASH
 
 from warcforhumans.compression import Compressor
 
+# hashlib's constructors are backed by OpenSSL, which already dispatches to SHA-NI / ARMv8 SHA instructions at runtime.
+# SHA-1 stays the default so digests (and revisit deduplication) don't depend on the CPU the capture ran on.
+_block_digest_factory = hashlib.sha1
+
+# Read size used when hashing and serializing stream-backed record content
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# File-backed content at least this large is copied into uncompressed WARCs with os.sendfile
+SENDFILE_MIN_SIZE = 64 * 1024
+
+# Digest algorithms written in base 16 rather than base 32,
+# per https://github.com/iipc/warc-specifications/issues/80#issuecomment-1637084423
+_BASE_16_DIGESTS = frozenset({"md5", "sha256", "sha512"})
+
+
+class _RandomUUIDPool:
+    """
+    Hands out random (version 4) UUID URNs, reading the randomness for many of them from ``os.urandom`` at once.
+    """
+    BATCH = 4096
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = b""
+        self._offset = 0
+        # A forked child must not hand out the same IDs as its parent
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._buffer = b""
+        self._offset = 0
+
+    def next_urn(self) -> str:
+        with self._lock:
+            if self._offset >= len(self._buffer):
+                self._buffer = os.urandom(16 * self.BATCH)
+                self._offset = 0
+            b = bytearray(self._buffer[self._offset:self._offset + 16])
+            self._offset += 16
+        b[6] = (b[6] & 0x0f) | 0x40 # version 4
+        b[8] = (b[8] & 0x3f) | 0x80 # RFC 4122 variant
+        h = b.hex()
+        return f"urn:uuid:{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+_record_ids = _RandomUUIDPool()
+
+
+_date_cache: tuple[int, str] = (-1, "")
+
+
+def _current_warc_date() -> str:
+    """
+    The current time formatted for ``WARC-Date``. The header only has second precision, so the formatted string is
+     reused for all calls within the same second.
+    """
+    global _date_cache
+    now = int(time.time())
+    cached_second, cached_date = _date_cache
+    if now != cached_second:
+        cached_date = datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        _date_cache = (now, cached_date)
+    return cached_date
+
 
 class WARCRecord:
     WARC_RECORD_ID = "WARC-Record-ID"
@@ -48,6 +119,8 @@ class WARCRecord:
     WARC_PROTOCOL = "WARC-Protocol" # https://github.com/iipc/warc-specifications/issues/42
     WARC_CIPHER_SUITE = "WARC-Cipher-Suite" # https://github.com/iipc/warc-specifications/issues/86
     HTTP_1_1 = "http/1.1"
+    VALID_TYPES = frozenset({"warcinfo", "response", "resource", "request", "metadata", "revisit", "conversion",
+                             "continuation"})
 
     def __init__(self, record_type: str = None, content_type: str = None, url: str | None = None, sock: socket = None):
         """
@@ -63,6 +136,7 @@ class WARCRecord:
         self.headers: dict[str, list[str]] = {}
         self.content = None
         self._close_content_stream : bool = False
+        self._digest_deferred: bool = False
 
         self.get_id()
 
@@ -78,8 +152,10 @@ class WARCRecord:
         if sock is not None:
             self.add_headers_for_socket(sock)
 
-        self._partial_content: bytes | BufferedRandom = b""
+        self._partial_content: bytearray | BufferedRandom = bytearray()
+        self._partial_digest: HASH | None = None
         self.max_in_memory_record_size: int = 1024 * 1024
+        self.compute_digests: bool = True # if disabled, content is stored without a WARC-Block-Digest
 
     def set_header(self, key: str, value: str | list[str]) -> None:
         """
@@ -109,14 +185,12 @@ class WARCRecord:
         self.headers.update(headers)
 
     def set_type(self, record_type: str):
-        valid_warc_record_types = {"warcinfo", "response", "resource", "request", "metadata", "revisit", "conversion",
-                                   "continuation"}
-        if record_type not in valid_warc_record_types:
+        if record_type not in WARCRecord.VALID_TYPES:
             raise ValueError(f"Invalid WARC record type: {record_type}")
 
         self.set_header(WARCRecord.WARC_TYPE, record_type)
 
-    def set_content(self, content: bytes | BinaryIO, content_type: str | None = None, block_digest: str | None = None, close: bool = False) -> None:
+    def set_content(self, content: bytes | BinaryIO, content_type: str | None = None, block_digest: str | None = None, close: bool = False, defer_digest: bool = False) -> None:
         """
         Sets the body content of the WARC record.
         :param content: The content of the record, as bytes or a seekable file object.
@@ -124,6 +198,8 @@ class WARCRecord:
         :param block_digest: A hash of content (as a hash object), used as the ``WARC-Block-Digest``. If not set, one
          will be generated with SHA-1.
         :param close: If content is a file object, whether it should be closed after the record is written.
+        :param defer_digest: If content is a file object and no block_digest is given, hash it when the record is
+         serialized instead of now. The content must not change until then.
         :return:
         """
         if content_type:
@@ -132,7 +208,7 @@ class WARCRecord:
         if isinstance(content, bytes):
             self._set_content_bytes(content, block_digest=block_digest)
         elif hasattr(content, "read") and hasattr(content, "seek"):
-            self._set_content_stream(content, close=close, block_digest=block_digest)
+            self._set_content_stream(content, close=close, block_digest=block_digest, defer_digest=defer_digest)
         else:
             raise ValueError("Unknown record content - expected a bytes or BufferedRandom like object")
 
@@ -141,39 +217,73 @@ class WARCRecord:
         self.content = content
         self.set_header(WARCRecord.CONTENT_LENGTH, str(len(content)))
 
-        if not block_digest:
-            block_digest = hashlib.sha1(content)
-        self.set_header(WARCRecord.WARC_BLOCK_DIGEST, hash_to_string(block_digest))
+        if not block_digest and self.compute_digests:
+            block_digest = _block_digest_factory(content)
+        if block_digest:
+            self.set_header(WARCRecord.WARC_BLOCK_DIGEST, hash_to_string(block_digest))
 
 
-    def _set_content_stream(self, stream: BinaryIO, close: bool = False, block_digest = None) -> None:
+    def _set_content_stream(self, stream: BinaryIO, close: bool = False, block_digest = None, defer_digest: bool = False) -> None:
         self.content = stream
-        stream.seek(0, io.SEEK_END)
-        self.set_header(WARCRecord.CONTENT_LENGTH, str((stream.tell())))
         self._close_content_stream = close
+        self._digest_deferred = False
+
+        in_memory = _in_memory_buffer(stream)
+        fileno = _stream_fileno(stream) if in_memory is None else None
+
+        if in_memory is not None:
+            with in_memory.getbuffer() as view:
+                length = len(view)
+        elif fileno is not None:
+            stream.flush()
+            length = os.fstat(fileno).st_size
+        elif block_digest or defer_digest or not self.compute_digests:
+            stream.seek(0, io.SEEK_END)
+            length = stream.tell()
+        else:
+            length = None # measured while hashing below, so the stream is only read once
 
-        if not block_digest:
-            block_digest = hashlib.sha1()
-            stream.seek(0)
-            while chunk := stream.read(2048):
-                block_digest.update(chunk)
+        if block_digest or not self.compute_digests:
+            pass
+        elif defer_digest:
+            self._digest_deferred = True
+        else:
+            block_digest, length = _hash_stream(stream, in_memory, fileno)
 
-        self.set_header(WARCRecord.WARC_BLOCK_DIGEST, hash_to_string(block_digest))
+        self.set_header(WARCRecord.CONTENT_LENGTH, str(length))
+        if block_digest:
+            self.set_header(WARCRecord.WARC_BLOCK_DIGEST, hash_to_string(block_digest))
 
     def partial_content(self, content: bytes, finish: bool = False) -> None:
-        if isinstance(self._partial_content, bytes):
+        """
+        Appends to the content of the record, spilling it to a temporary file once it grows past
+         ``max_in_memory_record_size``. The block digest is updated as content arrives, so finishing the record doesn't
+         have to read it all back.
+        :param content: The content to append
+        :param finish: Whether this is the last piece of content; if so, the record's content is set.
+        :return:
+        """
+        if self.compute_digests:
+            if self._partial_digest is None:
+                self._partial_digest = _block_digest_factory()
+            self._partial_digest.update(content)
+
+        if isinstance(self._partial_content, bytearray):
             if len(self._partial_content) + len(content) > self.max_in_memory_record_size:
                 file = tempfile.TemporaryFile()
                 _ = file.write(self._partial_content)
                 _ = file.write(content)
                 self._partial_content = file
             else:
-                self._partial_content += content
+                self._partial_content.extend(content) # in place, rather than copying everything so far on each call
         else:
             _ = self._partial_content.write(content)
 
         if finish:
-            self.set_content(self._partial_content, close=True)
+            content = self._partial_content
+            if isinstance(content, bytearray):
+                content = bytes(content)
+            self.set_content(content, block_digest=self._partial_digest, close=True)
 
 
 
@@ -190,7 +300,7 @@ class WARCRecord:
 
             self.set_header(WARCRecord.WARC_DATE, date.strftime(templ))
         else:
-            self.set_header(WARCRecord.WARC_DATE, datetime.now(timezone.utc).strftime(templ))
+            self.set_header(WARCRecord.WARC_DATE, _current_warc_date())
 
     def get_id(self) -> str:
         """
@@ -198,7 +308,7 @@ class WARCRecord:
         :return:
         """
         if WARCRecord.WARC_RECORD_ID not in self.headers:
-            self.set_header(WARCRecord.WARC_RECORD_ID, f"<{str(uuid.uuid4().urn)}>")
+            self.set_header(WARCRecord.WARC_RECORD_ID, f"<{_record_ids.next_urn()}>")
         return self.headers[WARCRecord.WARC_RECORD_ID][0]
 
     def get_type(self) -> str | None:
@@ -216,9 +326,10 @@ class WARCRecord:
         self.set_header(WARCRecord.WARC_IP_ADDRESS, sock.getpeername()[0])
 
         if isinstance(sock, SSLSocket):
-            encryption_protocol, protocol_version = sock.cipher()[1].split("v")
+            cipher_name, protocol, _ = sock.cipher()
+            encryption_protocol, _, protocol_version = protocol.partition("v")
             self.add_header(WARCRecord.WARC_PROTOCOL, encryption_protocol.lower() + "/" + protocol_version)
-            self.add_header(WARCRecord.WARC_CIPHER_SUITE, sock.cipher()[0])
+            self.add_header(WARCRecord.WARC_CIPHER_SUITE, cipher_name)
 
     def concurrent(self, record: WARCRecord) -> None:
         """
@@ -232,45 +343,312 @@ class WARCRecord:
         self.set_header(WARCRecord.WARC_CONCURRENT_TO, record.get_id())
         record.set_header(WARCRecord.WARC_CONCURRENT_TO, self.get_id())
 
-    def serialize_stream(self) -> Iterator[bytes]:
+    def _serialize_headers(self) -> bytes:
         """
-        Serializes this WARC record as bytes and yields it in chunks.
-        :return: Iterator[bytes] of the serialized record chunks
+        Serializes the version line and headers of this record, including the blank line that ends them.
+        :return: The encoded header block
         """
+        parts = [b"WARC/1.1\r\n"]
+        for key, value in self.headers.items():
+            key_b = key.encode("utf-8") + b": "
+            for v in value:
+                parts.append(key_b + v.encode("utf-8") + b"\r\n")
+        parts.append(b"\r\n")
+        return b"".join(parts)
 
+    def _check_serializable(self) -> None:
         if self.content is None:
             raise ValueError("Content is not set")
 
+        if self._digest_deferred:
+            stream = self.content
+            in_memory = _in_memory_buffer(stream)
+            block_digest, _ = _hash_stream(stream, in_memory, _stream_fileno(stream) if in_memory is None else None)
+            self.set_header(WARCRecord.WARC_BLOCK_DIGEST, hash_to_string(block_digest))
+            self._digest_deferred = False
+
         mandatory_headers = [WARCRecord.WARC_RECORD_ID, WARCRecord.CONTENT_LENGTH, WARCRecord.WARC_DATE, WARCRecord.WARC_TYPE]
         for header in mandatory_headers:
             if header not in self.headers:
                 raise ValueError(f"Mandatory header {header} is missing")
 
-        yield b"WARC/1.1\r\n"
-        for key, value in self.headers.items():
-            for v in value:
-                yield f"{key}: {v}\r\n".encode("utf-8")
-        yield b"\r\n"
+    def serialize_stream(self) -> Iterator[bytes]:
+        """
+        Serializes this WARC record as bytes and yields it in chunks.
+        :return: Iterator[bytes] of the serialized record chunks
+        """
+
+        self._check_serializable()
+        yield self._serialize_headers()
 
         if isinstance(self.content, bytes):
             yield self.content
         else:
-            chunk_size = 8192 # todo we should use a set chunk size everywhere
             self.content.seek(0)
             while True:
-                chunk = self.content.read(chunk_size)
+                chunk = self.content.read(STREAM_CHUNK_SIZE)
                 if not chunk:
                     break
                 yield chunk
 
         yield b"\r\n\r\n"
 
+    def write_to(self, file: BinaryIO) -> int:
+        """
+        Writes this record, uncompressed, to a file. Large content that is already in a file on disk is copied by the
+         kernel with ``os.sendfile`` when writing to a regular buffered file that isn't in append mode, rather than being
+         read through Python.
+        :param file: The file to write to
+        :return: The number of bytes written
+        """
+        content_fileno = None
+        out_fileno = None
+        size = 0
+        if hasattr(os, "sendfile") and isinstance(file, io.BufferedWriter) and not isinstance(self.content, bytes | None):
+            content_fileno = _stream_fileno(self.content)
+            if content_fileno is not None:
+                self.content.flush()
+                size = os.fstat(content_fileno).st_size
+                out_fileno = _stream_fileno(file)
+
+        if out_fileno is None or size < SENDFILE_MIN_SIZE:
+            written = 0
+            for chunk in self.serialize_stream():
+                written += file.write(chunk)
+            return written
+
+        self._check_serializable()
+        written = file.write(self._serialize_headers())
+        file.flush()
+        position = file.tell()
+
+        sent = 0
+        while sent < size:
+            try:
+                n = os.sendfile(out_fileno, content_fileno, sent, size - sent)
+            except OSError:
+                break # e.g. an O_APPEND destination; copy the rest below
+            if n == 0:
+                break
+            sent += n
+        # sendfile moved the file descriptor's offset, not the buffered writer's idea of it
+        file.seek(position + sent)
+        written += sent
+
+        if sent < size:
+            self.content.seek(sent)
+            while chunk := self.content.read(STREAM_CHUNK_SIZE):
+                written += file.write(chunk)
+
+        written += file.write(b"\r\n\r\n")
+        return written
+
     def close(self):
         if self._close_content_stream and hasattr(self.content, 'close'):
             self.content.close()
 
+def _in_memory_buffer(stream) -> io.BytesIO | None:
+    """
+    The in-memory buffer holding a stream's content, or None if the stream isn't only in memory.
+    """
+    if isinstance(stream, tempfile.SpooledTemporaryFile):
+        # _rolled and _file are private; checked against CPython 3.12 and 3.13. If they ever go away the stream is
+        # treated like any other file object instead of being read through its buffer.
+        buffer = getattr(stream, "_file", None)
+        if not getattr(stream, "_rolled", True) and isinstance(buffer, io.BytesIO):
+            return buffer
+        return None
+    if isinstance(stream, io.BytesIO):
+        return stream
+    return None
+
+
+def _hash_stream(stream: BinaryIO, in_memory: io.BytesIO | None, fileno: int | None) -> tuple[HASH, int]:
+    """
+    Hashes the whole of a stream with the block digest algorithm.
+    :param stream: The stream to hash
+    :param in_memory: The stream's in-memory buffer, from ``_in_memory_buffer``
+    :param fileno: The stream's file descriptor, from ``_stream_fileno``
+    :return: The hash object and the number of bytes hashed
+    """
+    if in_memory is not None:
+        # Hash the buffer in place rather than reading a copy of it back out
+        with in_memory.getbuffer() as view:
+            return _block_digest_factory(view), len(view)
+
+    block_digest = _block_digest_factory()
+    if fileno is not None:
+        stream.flush()
+        length = os.fstat(fileno).st_size
+        if length > 0:
+            # Hash the whole file in one call, letting hashlib release the GIL for the entire body
+            try:
+                with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mm:
+                    block_digest.update(mm)
+            except (OSError, ValueError):
+                # Not mappable (e.g. some special or network filesystems); file_digest still hashes in C-sized chunks
+                stream.seek(0)
+                block_digest = hashlib.file_digest(stream, _block_digest_factory)
+        return block_digest, length
+
+    stream.seek(0)
+    length = 0
+    buffer = bytearray(STREAM_CHUNK_SIZE)
+    view = memoryview(buffer)
+    while n := stream.readinto(buffer):
+        block_digest.update(view[:n])
+        length += n
+    return block_digest, length
+
+
+def _stream_fileno(stream) -> int | None:
+    """
+    The file descriptor behind a stream, or None if it's only in memory.
+    """
+    if _in_memory_buffer(stream) is not None:
+        return None # fileno() would force a SpooledTemporaryFile to disk
+    try:
+        return stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class _DirectIOWriter:
+    """
+    An append-only file writer that uses ``O_DIRECT`` so written data bypasses the page cache. Data is staged in a
+     page-aligned buffer and written out in whole pages; the unaligned tail is written through the page cache on close.
+    """
+    BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, path: str):
+        self.name = path
+        self.closed = False
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_DIRECT, 0o666)
+        self._buffer = mmap.mmap(-1, self.BUFFER_SIZE) # anonymous mappings are page-aligned
+
+        # Writes have to start at an aligned offset, so pick up an existing file's unaligned tail in the buffer
+        size = os.fstat(self._fd).st_size
+        self._offset = size - size % mmap.PAGESIZE
+        self._used = size - self._offset
+        if self._used:
+            with open(path, "rb") as f:
+                f.seek(self._offset)
+                self._buffer[:self._used] = f.read(self._used)
+
+    def write(self, data) -> int:
+        view = memoryview(data).cast("B")
+        written = 0
+        while written < len(view):
+            n = min(len(view) - written, self.BUFFER_SIZE - self._used)
+            self._buffer[self._used:self._used + n] = view[written:written + n]
+            self._used += n
+            written += n
+            if self._used == self.BUFFER_SIZE:
+                self._write_pages()
+        return written
+
+    def _write_pages(self):
+        aligned = self._used - self._used % mmap.PAGESIZE
+        if not aligned:
+            return
+        with memoryview(self._buffer) as view:
+            os.pwrite(self._fd, view[:aligned], self._offset)
+        self._buffer.move(0, aligned, self._used - aligned)
+        self._offset += aligned
+        self._used -= aligned
+
+    def tell(self) -> int:
+        return self._offset + self._used
+
+    def flush(self):
+        # Only whole pages can be written with O_DIRECT; anything else waits for the buffer to fill or for close()
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        self._write_pages()
+        os.close(self._fd)
+        if self._used:
+            with open(self.name, "r+b") as f:
+                f.seek(self._offset)
+                f.write(self._buffer[:self._used])
+        self._buffer.close()
+        self.closed = True
+
+
+class _BackgroundWriter:
+    """
+    An append-only file writer that hands writes off to a background thread, so the calling thread doesn't block on
+     write(2). Writes queued up while the thread is busy are submitted together in a single ``os.writev`` call.
+    """
+    MAX_QUEUED_WRITES = 1024
+
+    def __init__(self, path: str):
+        self.name = path
+        self.closed = False
+        self._file = open(path, "ab", buffering=0)
+        self._position = os.fstat(self._file.fileno()).st_size
+        self._queue = queue.Queue(maxsize=self.MAX_QUEUED_WRITES)
+        self._error: OSError | None = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, data) -> int:
+        if self._error is not None:
+            raise self._error
+        data = bytes(data) # the caller may reuse its buffer once we return
+        self._queue.put(data)
+        self._position += len(data)
+        return len(data)
+
+    def _run(self):
+        fd = self._file.fileno()
+        iov_max = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") else 16
+        done = False
+        while not done:
+            batch = [self._queue.get()]
+            while len(batch) < iov_max:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                batch = batch[:batch.index(None)]
+                done = True
+            if not batch or self._error is not None:
+                continue
+
+            try:
+                written = os.writev(fd, batch)
+                total = sum(len(b) for b in batch)
+                if written < total:
+                    rest = memoryview(b"".join(batch))[written:]
+                    while rest:
+                        rest = rest[os.write(fd, rest):]
+            except OSError as e:
+                self._error = e
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        # Writes are submitted as soon as the background thread gets to them; close() waits for all of them
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        self.closed = True
+        if self._error is not None:
+            raise self._error
+
+
 class WARCFile:
-    def __init__(self, file_path: str, create_warcinfo: bool = True, warcinfo_fields = None, compressor: Compressor = None, software: str = ""):
+    def __init__(self, file_path: str, create_warcinfo: bool = True, warcinfo_fields = None, compressor: Compressor = None, software: str = "", direct_io: bool = False, background_writes: bool = False, async_compress: bool = False, sendfile: bool = False):
         """
         Creates a new WARCFile to write WARC records to.
         :param file_path: Where the file should go, without ``.warc``
@@ -279,6 +657,16 @@ class WARCFile:
         :param compressor: ``Compressor`` to use for the file. The WARC will be uncompressed if not specified.
         :param software: The name of the software to add to warcinfo. warcforhumans will add its own name and version
          to the front of the provided string
+        :param direct_io: Write the file with ``O_DIRECT``, bypassing the page cache. Only used where the platform and
+         filesystem support it; otherwise the file is written normally.
+        :param background_writes: Write the file from a background thread, batching queued writes together. Ignored if
+         ``direct_io`` is in use.
+        :param async_compress: Serialize and compress records on a pool of worker threads, so ``write_record`` returns
+         before the compressor has run. Records are still written in the order they were given. ``bytes_written`` only
+         counts records once they are written out, so up to ``2 * workers`` records may still be in flight on top of it.
+        :param sendfile: Open the file without ``O_APPEND``, so large records whose content is already on disk can be
+         copied into an uncompressed WARC with ``os.sendfile``. Appends are then no longer atomic, so only use this when
+         nothing else writes to the same file at the same time.
         """
         self._warcinfo_record = None
         self._pending_records = []
@@ -289,8 +677,29 @@ class WARCFile:
             self._compressor = compressor
 
         self.file_path = file_path + ".warc" + self._compressor.file_extension()
-        self.file = open(self.file_path, "ab")
+        self.file = None
+        if direct_io and hasattr(os, "O_DIRECT"):
+            try:
+                self.file = _DirectIOWriter(self.file_path)
+            except OSError:
+                pass # e.g. a filesystem without O_DIRECT support
+        if self.file is None and background_writes:
+            self.file = _BackgroundWriter(self.file_path)
+        if self.file is None and sendfile:
+            # os.sendfile can't write to an O_APPEND file, so append by not truncating and starting at the end instead
+            self.file = open(self.file_path, "wb", buffering=1024 * 1024, opener=lambda path, flags: os.open(path, flags & ~os.O_TRUNC, 0o666))
+            self.file.seek(0, io.SEEK_END)
+        if self.file is None:
+            self.file = open(self.file_path, "ab", buffering=1024 * 1024)
         self._compressor.start(self.file)
+        self.bytes_written = self.file.tell()
+
+        self._compress_executor = None
+        self._compressing: collections.deque[concurrent.futures.Future[bytes]] = collections.deque()
+        if async_compress:
+            workers = min(4, os.cpu_count() or 1)
+            self._compress_executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+            self._max_compressing = workers * 2
 
         if create_warcinfo:
             self.create_warcinfo_record(fields=warcinfo_fields,software=software)
@@ -314,9 +723,7 @@ class WARCFile:
         fields["conformsTo"] = "https://bibnum.bnf.fr/WARC/WARC_ISO_28500_version1-1_latestdraft.pdf"
         fields["python-version"] = "python/" + sys.version.replace("\n", "")
 
-        body = str()
-        for key, value in fields.items():
-            body += f"{key}: {value}\r\n"
+        body = "".join([f"{key}: {value}\r\n" for key, value in fields.items()])
 
         warc_record.set_content(body.encode("utf-8"))
         warc_record.date()
@@ -325,7 +732,8 @@ class WARCFile:
 
     def write_record(self, record: WARCRecord, write_warcinfo_header: bool = True):
         """
-        Write a record to the file.
+        Write a record to the file. Output is buffered, so the record may not be on disk until the buffer fills or the
+         file is closed.
         :param record: The record to write
         :param write_warcinfo_header: Whether to write a ``WARC-Warcinfo-ID`` header for this record (if a warcinfo
          record for this file exists).
@@ -334,22 +742,90 @@ class WARCFile:
         if self._warcinfo_record is not None and write_warcinfo_header:
             record.set_header(WARCRecord.WARC_WARCINFO_ID, self._warcinfo_record.get_id())
 
-        self._compressor.write_record(record, self.file)
+        if self._compress_executor is not None:
+            self._compressing.append(self._compress_executor.submit(self._compress_record, record))
+            # Write out whatever has finished, in order, and wait if too many records are still being compressed
+            while self._compressing and (self._compressing[0].done() or len(self._compressing) > self._max_compressing):
+                self.bytes_written += self.file.write(self._compressing.popleft().result())
+            return
+
+        self.bytes_written += self._compressor.write_record(record, self.file)
+
+        record.close()
 
+    def _compress_record(self, record: WARCRecord) -> bytes:
+        buffer = io.BytesIO()
+        self._compressor.write_record(record, buffer)
         record.close()
-        self.file.flush()
+        return buffer.getvalue()
 
     def close(self):
-        self.file.close()
+        try:
+            if self._compress_executor is not None:
+                try:
+                    while self._compressing:
+                        self.bytes_written += self.file.write(self._compressing.popleft().result())
+                finally:
+                    self._compress_executor.shutdown(cancel_futures=True)
+        finally:
+            self.file.close()
+
+class RevisitIndex:
+    """
+    Maps payload digests to the record that first stored that payload, as ``(warc-record-id, warc-date,
+     warc-target-uri)``. Digests are kept as raw bytes and the fields as UTF-8 bytes with repeated dates shared, which
+     takes about 330 bytes per entry instead of about 410 for a dict of string tuples.
+    """
+    def __init__(self):
+        self._index: dict[bytes, tuple[bytes, bytes, bytes]] = {}
+        self._date_pool: dict[bytes, bytes] = {}
+
+    @staticmethod
+    def _key(payload_digest: str) -> bytes:
+        algorithm, _, value = payload_digest.partition(":")
+        try:
+            if algorithm in _BASE_16_DIGESTS:
+                raw = bytes.fromhex(value)
+            else:
+                raw = base64.b32decode(value)
+        except ValueError:
+            return payload_digest.encode("utf-8")
+        return algorithm.encode("utf-8") + b":" + raw
+
+    def __setitem__(self, payload_digest: str, value: tuple[str, str, str]):
+        record_id, date, target_uri = value
+        date_b = date.encode("utf-8")
+        date_b = self._date_pool.setdefault(date_b, date_b)
+        self._index[self._key(payload_digest)] = (record_id.encode("utf-8"), date_b, target_uri.encode("utf-8"))
+
+    def __getitem__(self, payload_digest: str) -> tuple[str, str, str]:
+        record_id, date, target_uri = self._index[self._key(payload_digest)]
+        return record_id.decode("utf-8"), date.decode("utf-8"), target_uri.decode("utf-8")
+
+    def __contains__(self, payload_digest: str) -> bool:
+        return self._key(payload_digest) in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
 
 class WARCWriter:
+    # Batches of records waiting for the background record thread before callers block
+    MAX_QUEUED_BATCHES = 64
+
     def __init__(self,
                  template: str,
                  compressor: Compressor = None,
                  rotate_mb: int = 15*1024,
                  software: str = "",
                  warcinfo_fields: dict[str, str] = None,
-                 revisit: bool = True
+                 revisit: bool = True,
+                 direct_io: bool = False,
+                 background_writes: bool = False,
+                 async_compress: bool = False,
+                 background_records: bool = False,
+                 compute_digests: bool = True,
+                 sendfile: bool = False
                  ):
         """
         Creates a WARCWriter, to manage writing WARC records.
@@ -364,51 +840,111 @@ class WARCWriter:
          to the front of the provided string
         :param warcinfo_fields: Fields to add to the warcinfo record.
         :param revisit: Whether to keep track of the information necessary (in memory) for ``check_for_revisit``
+        :param direct_io: Write WARC files with ``O_DIRECT`` where supported, bypassing the page cache.
+        :param background_writes: Write WARC files from a background thread, so writing records doesn't block on disk I/O.
+        :param async_compress: Compress records on worker threads, so writing records doesn't block on the compressor.
+         Records still being compressed aren't counted towards ``rotate_mb`` yet, so a file can end up a few records
+         larger than the limit.
+        :param background_records: Hand records to a single background thread that owns the WARC files, so
+         ``write_record`` and ``flush_pending`` return without serializing, compressing or writing anything. Errors from
+         the thread are raised from the next write or ``close``.
+        :param compute_digests: Whether to hash captured records for ``WARC-Block-Digest`` and ``WARC-Payload-Digest``.
+         Without payload digests, captured responses are never written as revisits.
+        :param sendfile: Open WARC files without ``O_APPEND`` so large captured responses can be copied into uncompressed
+         WARCs with ``os.sendfile``. Only use this when nothing else writes to the same files.
         """
         self.warc_file = None
         self.compressor = compressor if compressor else Compressor()
         self.template = template
         self.rotate_mb = rotate_mb
-        self.pending_records: list[WARCRecord] = []
+        self.pending_records: dict[str, WARCRecord] = {} # record ID -> record, in the order they were added
         self.software = software
         self.warcinfo_fields = warcinfo_fields
         self.files_made = 0
         self.closed = False
         self.revisit = revisit
+        self.direct_io = direct_io
+        self.background_writes = background_writes
+        self.async_compress = async_compress
+        self.compute_digests = compute_digests
+        self.sendfile = sendfile
         if revisit:
-            self.revisit_cache: dict[str, tuple[str, str, str]] = {} # payload-digest -> (warc-record-id, warc-date, warc-target-uri)
+            self.revisit_cache = RevisitIndex()
+        # Held while pending records, the revisit index or the current file are used, so threads can share a writer
+        self._lock = threading.RLock()
+
+        self._record_queue: queue.Queue[tuple[list[WARCRecord], bool] | None] | None = None
+        self._record_error: Exception | None = None
+        if background_records:
+            self._record_queue = queue.Queue(maxsize=self.MAX_QUEUED_BATCHES)
+            self._record_thread = threading.Thread(target=self._run_record_thread, daemon=True)
+            self._record_thread.start()
+
+    def _run_record_thread(self):
+        while (item := self._record_queue.get()) is not None:
+            records, rotate_between = item
+            if self._record_error is None:
+                try:
+                    self._write_records(records, rotate_between)
+                    continue
+                except Exception as e:
+                    self._record_error = e
+            for record in records:
+                record.close()
 
     def _create_file(self, rotate = True):
+        # With async_compress, bytes_written lags behind by the records still being compressed (see WARCFile)
         if (    self.warc_file
                 and rotate
                 and self.rotate_mb > 0
-                and self.warc_file.file.tell() >= self.rotate_mb * 1024 * 1024
+                and self.warc_file.bytes_written >= self.rotate_mb * 1024 * 1024
            ):
             self.warc_file.close()
             self.warc_file = None
         if not self.warc_file:
             template_data = {"date": datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"),
                              "number": f"{self.files_made:05d}",
-                             "serial": ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))}
-            name = string.Template(self.template).substitute(template_data)
-            self.warc_file = WARCFile(name, compressor=self.compressor, software=self.software, warcinfo_fields=self.warcinfo_fields)
+                             "serial": base64.b32encode(os.urandom(5)).decode("ascii").lower()} # 8 chars of a-z, 2-7
+            name = self._template.substitute(template_data)
+            self.warc_file = WARCFile(name, compressor=self.compressor, software=self.software, warcinfo_fields=self.warcinfo_fields, direct_io=self.direct_io, background_writes=self.background_writes, async_compress=self.async_compress, sendfile=self.sendfile)
             self.files_made += 1
 
+    @property
+    def template(self) -> str:
+        return self._template.template
+
+    @template.setter
+    def template(self, template: str):
+        # Parsed once here rather than on every file rotation
+        self._template = string.Template(template)
+
     def flush_pending(self):
         """
         Write records that have been finished but not yet written.
         :return:
         """
-        temp = self.pending_records
-        self.pending_records = []
-        self.write_records(temp)
+        with self._lock:
+            temp = self.pending_records
+            self.pending_records = {}
+            self.write_records(list(temp.values()))
+
+    def add_pending(self, *records: WARCRecord):
+        """
+        Queue finished records to be written on the next ``flush_pending``.
+        :param records: The records to queue, in the order they should be written
+        :return:
+        """
+        with self._lock:
+            for record in records:
+                self.pending_records[record.get_id()] = record
 
     def discard_pending(self):
         """
         Discard records that have been finished but not yet written.
         :return:
         """
-        self.pending_records = []
+        with self._lock:
+            self.pending_records = {}
 
     def discard(self, record_id):
         """
@@ -416,7 +952,8 @@ class WARCWriter:
         :param record_id: ID of the record to discard
         :return:
         """
-        self.pending_records = [r for r in self.pending_records if r.get_id() != record_id]
+        with self._lock:
+            self.pending_records.pop(record_id, None)
 
 
     def write_record(self, record: WARCRecord, rotate = True):
@@ -427,10 +964,9 @@ class WARCWriter:
          the rotation size. This can be useful to ensure that request/response pairs don't get split between files.
         :return:
         """
-        if self.closed:
-            raise ValueError("WARCWriter is closed")
+        self.write_records([record], rotate_between=rotate)
 
-        self._create_file(rotate=rotate)
+    def _index_for_revisits(self, record: WARCRecord):
         if self.revisit and record.get_type() == "response":
             payload_digest = record.headers.get(WARCRecord.WARC_PAYLOAD_DIGEST, [None])[0]
             date = record.headers.get(WARCRecord.WARC_DATE, [None])[0]
@@ -439,7 +975,10 @@ class WARCWriter:
             if payload_digest and date and target_uri:
                 self.revisit_cache[payload_digest] = (record_id, date, target_uri)
 
-        self.warc_file.write_record(record)
+    def _write_records(self, records: list[WARCRecord], rotate_between: bool):
+        for record in records:
+            self._create_file(rotate=rotate_between)
+            self.warc_file.write_record(record)
 
     def check_for_revisit(self, payload_digest: str) -> tuple[bool, dict[str, list[str]]]:
         """
@@ -452,10 +991,11 @@ class WARCWriter:
         if not self.revisit:
             return False, {}
 
-        if not payload_digest in self.revisit_cache:
-            return False, {}
+        with self._lock:
+            if not payload_digest in self.revisit_cache:
+                return False, {}
 
-        record_id, date, target_uri = self.revisit_cache[payload_digest]
+            record_id, date, target_uri = self.revisit_cache[payload_digest]
         headers = {
             WARCRecord.WARC_REFERS_TO: [record_id],
             WARCRecord.WARC_REFERS_TO_DATE: [date],
@@ -471,15 +1011,36 @@ class WARCWriter:
         :param rotate_between: Whether the records to be written can be split between different WARC files
         :return:
         """
-        for record in records:
-            self.write_record(record, rotate=rotate_between)
+        with self._lock:
+            if self.closed:
+                raise ValueError("WARCWriter is closed")
+            if self._record_error is not None:
+                raise self._record_error
+
+            # Indexed here rather than when written, so revisit checks see records still queued for the background thread
+            for record in records:
+                self._index_for_revisits(record)
+
+            if self._record_queue is not None:
+                self._record_queue.put((records, rotate_between))
+            else:
+                self._write_records(records, rotate_between)
 
     def close(self):
-        if not self.closed:
-            self.flush_pending()
-            if self.warc_file:
-                self.warc_file.close()
-            self.closed = True
+        with self._lock:
+            if self.closed:
+                return
+            try:
+                self.flush_pending()
+            finally:
+                if self._record_queue is not None:
+                    self._record_queue.put(None)
+                    self._record_thread.join()
+                if self.warc_file:
+                    self.warc_file.close()
+                self.closed = True
+            if self._record_error is not None:
+                raise self._record_error
 
     def get_session(self) -> requests.Session:
         """
@@ -498,9 +1059,24 @@ def hash_to_string(h: HASH) -> str:
     :param h: The hash to convert
     :return: A string like "sha1:AIKLJM2V2EOKR4WOIWUWRQTEMUN57P4D"
     """
-    # Typical encoding is base 16 per https://github.com/iipc/warc-specifications/issues/80#issuecomment-1637084423
-    base_16 = {"md5", "sha256", "sha512"}
-    if h.name in base_16:
+    if h.name in _BASE_16_DIGESTS:
         return f"{h.name}:{h.hexdigest()}"
 
-    return f"{h.name}:{base64.b32encode(h.digest()).decode("utf-8")}"
\ No newline at end of file
+    return f"{h.name}:{_b32encode(h.digest())}"
+
+
+_B32_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+_B32_PAIRS = [a + b for a in _B32_ALPHABET for b in _B32_ALPHABET] # 10 bits -> 2 characters
+
+
+def _b32encode(data: bytes) -> str:
+    """
+    Base32-encodes a digest. Equivalent to ``base64.b32encode(data).decode()``, but for unpadded lengths (like SHA-1's
+     20 bytes) the whole digest is converted as one integer, two characters at a time.
+    :param data: The bytes to encode
+    :return: The base32 string
+    """
+    if len(data) % 5:
+        return base64.b32encode(data).decode("utf-8")
+    n = int.from_bytes(data)
+    return "".join([_B32_PAIRS[(n >> shift) & 0x3ff] for shift in range(len(data) * 8 - 10, -1, -10)])
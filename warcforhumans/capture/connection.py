@@ -5,7 +5,6 @@ import ssl
 import tempfile
 import typing
 from collections.abc import Generator
-from io import BufferedRandom
 from typing import override
 
 import h11
@@ -16,8 +15,42 @@ import warcforhumans.api as warc
 from warcforhumans.api import WARCWriter, WARCRecord
 from warcforhumans.capture import util
 
-CHUNK_SIZE = 2048
+CHUNK_SIZE = 64 * 1024 # large reads mean fewer, larger hash updates and h11 events per response
 MIN_REVISIT_PAYLOAD_SIZE = 1024
+HEADER_READ_SIZE = 16384
+MAX_MEMORY_RESPONSE_SIZE = 512 * 1024 # responses larger than this are spooled to a temporary file on disk
+RESPONSE_WRITE_BATCH_SIZE = 64 * 1024 # received bytes are collected up to this size before being written to the response file
+
+_DEFAULT_PORTS: dict[str, int] = {"http": 80, "https": 443}
+
+# Headers WARCRecord.add_headers_for_socket sets, which are the same for every record on a connection
+_SOCKET_HEADERS = frozenset({WARCRecord.WARC_IP_ADDRESS, WARCRecord.WARC_PROTOCOL, WARCRecord.WARC_CIPHER_SUITE})
+
+# WARC-Protocol values for the HTTP versions h11 reports, so they aren't formatted for every response
+_WARC_PROTOCOLS: dict[bytes, str] = {b"1.1": WARCRecord.HTTP_1_1, b"1.0": "http/1.0"}
+
+def _read_header_block(file: typing.BinaryIO) -> bytes:
+    """
+    Reads an HTTP message's header block, up to and including the blank line that ends it, by scanning large reads for
+     the terminating CRLFCRLF rather than reading line by line.
+    :param file: The file containing the message, positioned at its start
+    :return: The header block, or the whole file if it has no complete header block
+    """
+    # Nearly every header block fits in the first read, so find it there without copying into a buffer
+    first = file.read(HEADER_READ_SIZE)
+    end = first.find(b"\r\n\r\n")
+    if end != -1:
+        return first[:end + 4]
+
+    buffer = bytearray(first)
+    while chunk := file.read(HEADER_READ_SIZE):
+        search_from = max(0, len(buffer) - 3)
+        buffer += chunk
+        end = buffer.find(b"\r\n\r\n", search_from)
+        if end != -1:
+            return bytes(buffer[:end + 4])
+    return bytes(buffer)
+
 
 class ConnectionInfo(typing.NamedTuple):
     scheme: str
@@ -159,43 +192,62 @@ class WARCWritingH11Connection(H11Connection):
         self.request_record: WARCRecord | None = None
         self.response_record: WARCRecord | None = None
         self.response_payload_hash: HASH | None = None
-        self.response_file: BufferedRandom | None = None
+        self.response_file: tempfile.SpooledTemporaryFile | None = None
+        self._spare_response_file: tempfile.SpooledTemporaryFile | None = None # left over from a revisit, for reuse
+        self._recv_buffer: bytearray = bytearray(CHUNK_SIZE)
+        self._unwritten_response_data: bytearray = bytearray() # received, but not yet written to response_file
         self.warc_writer: WARCWriter = warc_writer
-
+        self._cached_url_prefix: str | None = None
+        self._socket_headers: list[tuple[str, str]] | None = None
+
+    def _url_prefix(self) -> str:
+        """
+        The scheme, host and port part of target URIs for requests on this connection. These don't change over the
+         connection's lifetime, so this is only worked out once.
+        """
+        if self._cached_url_prefix is not None:
+            return self._cached_url_prefix
+
+        default_port = _DEFAULT_PORTS.get(self.info.scheme)
+        if default_port is None:
+            raise ValueError("Scheme for connection is not http or https.")
+
+        # the host should be wrapped in [] if it's an IPv6 literal to comply with the WARC spec
+        host = self.info.host
+        try:
+            ip = ipaddress.ip_address(host[1:-1] if host.startswith("[") and host.endswith("]") else host)
+            if isinstance(ip, ipaddress.IPv6Address):
+                host = f"[{ip}]"
+        except ValueError:
+            pass # not an IP address
+
+        port = "" if self.info.port == default_port else f":{self.info.port}"
+        url = "".join((self.info.scheme, "://", host, port))
+        self._cached_url_prefix = url
+        return url
+
+    def _add_socket_headers(self, record: WARCRecord) -> None:
+        """
+        Adds the headers describing this connection's socket (peer address, TLS protocol and cipher) to a record. The
+         socket is only queried for the first record; later records on the connection reuse the values.
+        """
+        if self._socket_headers is None:
+            probe = WARCRecord(sock=self.sock)
+            self._socket_headers = [(key, value) for key, values in probe.headers.items()
+                                    if key in _SOCKET_HEADERS for value in values]
+        for key, value in self._socket_headers:
+            record.add_header(key, value)
 
     @override
     def send_event(self, event: h11.Event) -> None:
         if isinstance(event, h11.Request):
             # todo check if there's another wip record
-            if self.info.scheme != "http" and self.info.scheme != "https":
-                raise ValueError("Scheme for connection is not http or https.")
-
-            # the host should be wrapped in [] if it's an IPv6 literal to comply with the WARC spec
-            url: str = self.info.scheme + "://"
-            try:
-                host = self.info.host
-                if self.info.host.startswith("[") and self.info.host.endswith("]"):
-                    # strip for parsing
-                    host = host[1:-1]
-
-                ip = ipaddress.ip_address(host)
-                if isinstance(ip, ipaddress.IPv6Address):
-                    url += f"[{ip}]"
-                else:
-                    url += self.info.host
-            except ValueError:
-                # not an IP address
-                url += self.info.host
-
-            if self.info.scheme == "https" and self.info.port != 443:
-                url += ":" + str(self.info.port)
-            elif self.info.scheme == "http" and self.info.port != 80:
-                url += ":" + str(self.info.port)
-
-            url += event.target.decode("iso-8859-1")
-
-            request_record: WARCRecord = WARCRecord("request", url=url, content_type=WARCRecord.CONTENT_HTTP_REQUEST, sock=self.sock)
+            url: str = self._url_prefix() + event.target.decode("iso-8859-1")
+
+            request_record: WARCRecord = WARCRecord("request", url=url, content_type=WARCRecord.CONTENT_HTTP_REQUEST)
+            self._add_socket_headers(request_record)
             request_record.add_header(WARCRecord.WARC_PROTOCOL, WARCRecord.HTTP_1_1)
+            request_record.compute_digests = self.warc_writer.compute_digests
             request_record.date()
             self.request_record = request_record
 
@@ -209,6 +261,10 @@ class WARCWritingH11Connection(H11Connection):
             self.sock.sendall(b)
             self.request_record.partial_content(b, finish=isinstance(event, h11.EndOfMessage))
 
+    def _write_response_data(self) -> None:
+        _ = self.response_file.write(self._unwritten_response_data)
+        self._unwritten_response_data.clear()
+
     @override
     def next_event(self, chunk_size: int) -> h11.Event | type[h11.PAUSED]:
         if self.request_record is None:
@@ -216,24 +272,39 @@ class WARCWritingH11Connection(H11Connection):
 
         if not self.response_record:
             # todo make sure there's a request record and no opened response record, etc
-            self.response_record = WARCRecord(record_type="response", content_type=WARCRecord.CONTENT_HTTP_RESPONSE, url=self.request_record.headers[WARCRecord.WARC_TARGET_URI][0], sock=self.sock)
+            self.response_record = WARCRecord(record_type="response", content_type=WARCRecord.CONTENT_HTTP_RESPONSE, url=self.request_record.headers[WARCRecord.WARC_TARGET_URI][0])
+            self._add_socket_headers(self.response_record)
             self.response_record.set_header(WARCRecord.WARC_DATE, self.request_record.headers[WARCRecord.WARC_DATE][0])
+            self.response_record.compute_digests = self.warc_writer.compute_digests
 
-            self.response_file = tempfile.TemporaryFile()
-            self.response_payload_hash = hashlib.sha1()
+            if self._spare_response_file is not None:
+                self.response_file = self._spare_response_file
+                self._spare_response_file = None
+                self.response_file.seek(0)
+                self.response_file.truncate()
+            else:
+                self.response_file = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORY_RESPONSE_SIZE)
+            self._unwritten_response_data.clear()
+            self.response_payload_hash = hashlib.sha1() if self.warc_writer.compute_digests else None
 
 
         while True:
             event = self.conn.next_event()
             if isinstance(event, h11.NEED_DATA):
                 # This will read bytes past the end of the HTTP response. Extra bytes will be truncated when EndOfMessage is reached.
-                bytes_received = self.sock.recv(chunk_size)
+                # Receive into a reused buffer; h11 and the response file both copy what they keep.
+                if len(self._recv_buffer) < chunk_size:
+                    self._recv_buffer = bytearray(chunk_size)
+                received = self.sock.recv_into(self._recv_buffer, chunk_size)
+                bytes_received = memoryview(self._recv_buffer)[:received]
                 self.conn.receive_data(bytes_received)
 
                 if self.response_file is None:
                     raise RuntimeError("No open response file (when writing response content)")
 
-                _ = self.response_file.write(bytes_received)
+                self._unwritten_response_data += bytes_received
+                if len(self._unwritten_response_data) >= RESPONSE_WRITE_BATCH_SIZE:
+                    self._write_response_data()
                 continue
             break
 
@@ -247,12 +318,14 @@ class WARCWritingH11Connection(H11Connection):
             self.closed = True
 
         if isinstance(event, h11.Response):
-            self.response_record.add_header(WARCRecord.WARC_PROTOCOL, f"http/{event.http_version.decode()}")
+            protocol = _WARC_PROTOCOLS.get(event.http_version) or f"http/{event.http_version.decode()}"
+            self.response_record.add_header(WARCRecord.WARC_PROTOCOL, protocol)
 
 
         if isinstance(event, h11.EndOfMessage):
             if not self.response_file:
                 raise RuntimeError("Response file content is none when trying to finish a response message.")
+            self._write_response_data()
 
             # Truncate any bytes that came after the end of the HTTP response
             # trailing_data contains bytes that were not consumed by h11 for this message
@@ -263,25 +336,24 @@ class WARCWritingH11Connection(H11Connection):
                 new_size = file_size - excess_bytes
                 self.response_file.truncate(new_size)
 
-            if self.response_payload_hash is None:
-                raise RuntimeError("No payload hash when trying to finish response.")
-            self.response_record.set_header(WARCRecord.WARC_PAYLOAD_DIGEST, warc.hash_to_string(self.response_payload_hash))
+            if self.response_payload_hash is not None:
+                self.response_record.set_header(WARCRecord.WARC_PAYLOAD_DIGEST, warc.hash_to_string(self.response_payload_hash))
 
-            revisit, headers = self.warc_writer.check_for_revisit(self.response_record.headers[WARCRecord.WARC_PAYLOAD_DIGEST][0])
+            # Only look for a revisit if the payload can be big enough to be worth one; the header block (and so the
+            # exact payload size) is only needed once the lookup has found a match
+            self.response_file.seek(0, 2) # seek to end
+            response_size = self.response_file.tell()
+            revisit, headers = False, {}
+            if self.response_payload_hash is not None and self.warc_writer.revisit and response_size >= MIN_REVISIT_PAYLOAD_SIZE:
+                revisit, headers = self.warc_writer.check_for_revisit(self.response_record.headers[WARCRecord.WARC_PAYLOAD_DIGEST][0])
 
-            # grab up to the first \r\n\r\n (header block)
-            self.response_file.seek(0)  # ensure we are back at the start
-            header_content = b""
-            while True:
-                line = self.response_file.readline(CHUNK_SIZE)
-                header_content += line
-                if not line or line == b"\r\n":
-                    break
+            if revisit:
+                # grab up to the first \r\n\r\n (header block)
+                self.response_file.seek(0)  # ensure we are back at the start
+                header_content = _read_header_block(self.response_file)
 
-            # Don't revisit if the payload is too small
-            payload_start = self.response_file.tell()
-            self.response_file.seek(0, 2) # seek to end
-            revisit = self.response_file.tell() - payload_start >= MIN_REVISIT_PAYLOAD_SIZE and revisit
+                # Don't revisit if the payload is too small
+                revisit = response_size - len(header_content) >= MIN_REVISIT_PAYLOAD_SIZE
 
 
             if revisit:
@@ -289,12 +361,14 @@ class WARCWritingH11Connection(H11Connection):
                 self.response_record.set_type("revisit")
 
                 self.response_record.set_content(header_content)
+                # The record only keeps the headers, so the buffer can be reused for the next response
+                self._spare_response_file = self.response_file
             else:
-                self.response_record.set_content(self.response_file, close = True)
+                # hashed when the record is written, which may be on a compression worker rather than this thread
+                self.response_record.set_content(self.response_file, close = True, defer_digest=True)
 
             self.response_record.concurrent(self.request_record)
-            self.warc_writer.pending_records.append(self.response_record)
-            self.warc_writer.pending_records.append(self.request_record)
+            self.warc_writer.add_pending(self.response_record, self.request_record)
             self.warc_writer.flush_pending()
 
             self.request_record = None
@@ -315,4 +389,7 @@ class WARCWritingH11Connection(H11Connection):
         if self.conn.our_state != h11.IDLE or self.conn.their_state != h11.IDLE:
             self.events_until_end(CHUNK_SIZE)
 
+        if self._spare_response_file is not None:
+            self._spare_response_file.close()
+            self._spare_response_file = None
         self.sock.close()
\ No newline at end of file
@@ -33,7 +33,10 @@ from warcforhumans.capture.connection import ConnectionInfo, H11Connection, Secu
     WARCWritingH11Connection
 
 DEFAULT_USER_AGENT: str = f"warcforhumans/{version("warcforhumans")} (like urllib3/{version("urllib3")}"
-CHUNK_SIZE = 2048
+CHUNK_SIZE = 64 * 1024
+
+# urllib3's version number and status-line version for the HTTP versions h11 reports
+_HTTP_VERSIONS: dict[bytes, tuple[int, str]] = {b"1.1": (11, "HTTP/1.1"), b"1.0": (10, "HTTP/1.0")}
 
 
 class BodyStreamFromH11Response(typing.IO[bytes]):
@@ -125,8 +128,12 @@ class HTTPConnection(_BaseHTTPConnection):
         if self.socket_options is None:
             self.socket_options = []
 
-        #return self.ConnectionCls(ConnectionInfo(self.scheme, self.host, self.port, socket_options=self.socket_options), secure_options=self.secure_connection_options)
-        conn = WARCWritingH11Connection(ConnectionInfo(self.scheme, self.host, self.port, socket_options=self.socket_options), self.warc_writer, secure_options=self.secure_connection_options)
+        info = ConnectionInfo(self.scheme, self.host, self.port, socket_options=self.socket_options)
+        if self.warc_writer is None:
+            # nothing to capture, so skip the WARC bookkeeping entirely
+            conn = self.ConnectionCls(info, secure_options=self.secure_connection_options)
+        else:
+            conn = WARCWritingH11Connection(info, self.warc_writer, secure_options=self.secure_connection_options)
         self.is_verified = conn.is_verified
         return conn
 
@@ -262,18 +269,14 @@ class HTTPConnection(_BaseHTTPConnection):
         for header, value in r.headers:
             urllib3_formatted_headers.add(header.decode("iso-8859-1"), value.decode("iso-8859-1"))
 
-        version_number = 0
-        if r.http_version == b"1.1":
-            version_number = 11
-        if r.http_version == b"1.0":
-            version_number = 10
+        version_number, version_string = _HTTP_VERSIONS.get(r.http_version) or (0, "HTTP/" + r.http_version.decode())
 
         response = HTTPResponse(
             body=BodyStreamFromH11Response(self.conn),
             headers=urllib3_formatted_headers,
             status=r.status_code,
             version=version_number,
-            version_string="HTTP/"+r.http_version.decode(),
+            version_string=version_string,
             reason=http.client.responses[r.status_code],
             preload_content=resp_options.preload_content,
             decode_content=resp_options.decode_content,
@@ -1,3 +1,5 @@
+import threading
+import zlib
 from typing import BinaryIO
 
 import zstandard as zstd
@@ -12,15 +14,14 @@ class Compressor:
     """
     A no-op WARC record compressor for other code to use as a base.
     """
-    def write_record(self, record: 'WARCRecord', file: BinaryIO):
+    def write_record(self, record: 'WARCRecord', file: BinaryIO) -> int:
         """
         Write an entire record.
         :param record: The WARCRecord to write
         :param file: The file on disk to write to
-        :return:
+        :return: The number of bytes written to the file
         """
-        for chunk in record.serialize_stream():
-            file.write(chunk)
+        return record.write_to(file)
 
     def file_extension(self) -> str:
         """
@@ -51,16 +52,33 @@ class ZSTDCompressor(Compressor):
 
         # detect if dictionary is zstd-compressed
 
-    def write_record(self, record: 'WARCRecord', file: BinaryIO):
-        if self.dict is not None:
-            cctx = zstd.ZstdCompressor(level=self.level, dict_data=zstd.ZstdCompressionDict(self.dict))
-        else:
-            cctx = zstd.ZstdCompressor(level=self.level)
-
-        compressor = cctx.stream_writer(file)
+        # The dictionary is parsed and prepared for this level once, rather than for every record
+        self._dict_data: zstd.ZstdCompressionDict | None = None
+        if dictionary is not None:
+            self._dict_data = zstd.ZstdCompressionDict(dictionary)
+            self._dict_data.precompute_compress(level=level)
+        # ZstdCompressor objects can't be used from several threads at once, so each thread gets its own
+        self._local = threading.local()
+
+    def _get_cctx(self) -> zstd.ZstdCompressor:
+        cctx = getattr(self._local, "cctx", None)
+        if cctx is None:
+            cctx = zstd.ZstdCompressor(level=self.level, dict_data=self._dict_data)
+            self._local.cctx = cctx
+        return cctx
+
+    def write_record(self, record: 'WARCRecord', file: BinaryIO) -> int:
+        cctx = self._get_cctx()
+        if isinstance(record.content, bytes):
+            # Already in memory, so compress the whole record as one frame in a single call
+            return file.write(cctx.compress(b"".join(record.serialize_stream())))
+
+        compressor = cctx.stream_writer(file, write_return_read=False)
+        written = 0
         for chunk in record.serialize_stream():
-            compressor.write(chunk)
-        compressor.flush(zstd.FLUSH_FRAME)
+            written += compressor.write(chunk)
+        written += compressor.flush(zstd.FLUSH_FRAME)
+        return written
 
     def file_extension(self) -> str:
         return ".zst"
@@ -72,10 +90,8 @@ class ZSTDCompressor(Compressor):
         # Write a skippable frame with the dictionary at the start of the file
         # magic number 0x184D2A5D per https://iipc.github.io/warc-specifications/specifications/warc-zstd/
 
-        file.write(b'\x5D\x2A\x4D\x18')
         size = len(self.dict)
-        file.write(size.to_bytes(4, 'little'))
-        file.write(self.dict)
+        file.write(b''.join((b'\x5D\x2A\x4D\x18', size.to_bytes(4, 'little'), self.dict)))
 
 
 class GZIPCompressor(Compressor):
@@ -86,11 +102,14 @@ class GZIPCompressor(Compressor):
         """
         self.level = level
 
-    def write_record(self, record: 'WARCRecord', file: BinaryIO):
-        import gzip
-        with gzip.GzipFile(fileobj=file, mode='ab', compresslevel=self.level) as gz_file:
-            for chunk in record.serialize_stream():
-                gz_file.write(chunk)
+    def write_record(self, record: 'WARCRecord', file: BinaryIO) -> int:
+        # wbits=31 makes zlib write the gzip header and CRC-32/size trailer itself, so each record is one gzip member
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        written = 0
+        for chunk in record.serialize_stream():
+            written += file.write(compressor.compress(chunk))
+        written += file.write(compressor.flush(zlib.Z_FINISH))
+        return written
 
     def file_extension(self) -> str:
         return ".gz"